@@ -1,12 +1,29 @@
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
+import asyncio
+import hashlib
+import json
 import os
+import signal
+import time
+from utils.speedrun import client as speedrun
+from utils import leaderboards, metrics, sharding, storage
+from utils.command_tree import InstrumentedCommandTree, record_command
+from utils.watchdog import LoopWatchdog
+
+# Hash of the last command tree we synced, so restarts and reconnects can skip the sync
+COMMAND_HASH_FILE = "command_tree.hash"
 
 # Define intents and bot initialization
 intents = discord.Intents.default()
 intents.message_content = True  # Enable message content intent
-bot = commands.Bot(command_prefix="!", intents=intents)
+if sharding.SHARDED:
+    # One gateway connection per shard; SHARD_COUNT/SHARD_IDS pick this process's shards, or Discord decides
+    bot = commands.AutoShardedBot(command_prefix="!", intents=intents, tree_cls=InstrumentedCommandTree,
+                                  **sharding.bot_options())
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents, tree_cls=InstrumentedCommandTree)
 
 @bot.event
 async def on_ready():
@@ -20,32 +37,112 @@ async def on_ready():
         ),
     )
     print(f"We have logged in as {bot.user}")
+
+@bot.event
+async def on_app_command_completion(interaction, command):
+    record_command(interaction, "ok")
+
+def command_tree_hash():
+    """Hash the payload Discord would get for our global commands."""
+    payload = []
+    for command in bot.tree.get_commands():
+        try:
+            payload.append(command.to_dict(bot.tree))
+        except TypeError:
+            payload.append(command.to_dict())  # discord.py < 2.4
+    payload.sort(key=lambda command: (command.get("type", 1), command["name"]))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+def read_synced_hash():
+    try:
+        with open(COMMAND_HASH_FILE, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+# Runs once after login, before connecting to the gateway, so reconnects never sync again
+async def setup_hook():
+    if not sharding.is_primary():
+        return  # The command tree is global, worker 0 syncs it for everyone
+    tree_hash = command_tree_hash()
+    if tree_hash == read_synced_hash():
+        print("Slash commands unchanged since the last sync, skipping.")
+        return
     try:
         # Sync slash commands with Discord
         synced = await bot.tree.sync()
         print(f"Synced {len(synced)} commands.")
+        with open(COMMAND_HASH_FILE, 'w') as f:
+            f.write(tree_hash)
     except Exception as e:
         print(f"Failed to sync commands: {e}")
 
-# Load cogs from the "commands" folder
+bot.setup_hook = setup_hook
+
+async def load_cog(filename):
+    started = time.perf_counter()
+    try:
+        await bot.load_extension(f'commands.{filename[:-3]}')
+        print(f"Loaded cog: {filename} ({(time.perf_counter() - started) * 1000:.0f} ms)")
+    except Exception as e:
+        print(f"Failed to load cog {filename}: {e}")
+
+# Load cogs from the "commands" folder, all at once
 async def load_cogs():
     print("Loading cogs...")
-    for filename in os.listdir('./commands'):
-        if filename.endswith('.py') and not filename.startswith('__'):
-            try:
-                await bot.load_extension(f'commands.{filename[:-3]}')
-                print(f"Loaded cog: {filename}")
-            except Exception as e:
-                print(f"Failed to load cog {filename}: {e}")
+    started = time.perf_counter()
+    filenames = [filename for filename in sorted(os.listdir('./commands'))
+                 if filename.endswith('.py') and not filename.startswith('__')]
+    await asyncio.gather(*(load_cog(filename) for filename in filenames))
+    print(f"Loaded {len(filenames)} cogs in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+# Plays fake rounds through the shared storage instead of connecting (see launcher.py --stub)
+async def run_stub_gateway():
+    from utils.stub_gateway import StubGateway
+
+    shard_count = sharding.SHARD_COUNT or 1
+    gateway = StubGateway(sharding.SHARD_IDS if sharding.SHARD_IDS is not None else range(shard_count), shard_count)
+    try:
+        consistent = await gateway.run()
+    finally:
+        await leaderboards.flush_all()
+        await storage.close_all()
+    raise SystemExit(0 if consistent else 1)
 
 # Main function
 async def main():
+    if os.getenv("STUB_GATEWAY") == "1":
+        await run_stub_gateway()
     async with bot:
         await load_cogs()
-        await bot.start(token)
+        # Prometheus metrics on a local port (one per worker), METRICS_PORT=0 turns it off
+        metrics.watch_bot(bot)
+        metrics_port = int(os.getenv("METRICS_PORT", "9108"))
+        metrics_server = await metrics.start_server(port=metrics_port + sharding.WORKER_ID if metrics_port else 0)
+        loop_lag = asyncio.create_task(metrics.watch_loop_lag())
+        # Logs the stack (and command) whenever something blocks the loop for longer than this
+        watchdog = LoopWatchdog(threshold=float(os.getenv("STALL_THRESHOLD", "0.5")))
+        watchdog.start()
+        # Deploys and restarts stop the worker with SIGTERM. Close the bot cleanly instead of
+        # dying on the spot, so cogs unload (queued role edits go out) and the finally block
+        # below writes the buffered scores
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(bot.close()))
+        except NotImplementedError:
+            pass  # Windows has no loop signal handlers
+        try:
+            await bot.start(token)
+        finally:
+            watchdog.stop()
+            loop_lag.cancel()
+            if metrics_server is not None:
+                await metrics_server.cleanup()
+            # Close the shared speedrun.com session and flush the databases
+            await speedrun.close()
+            await leaderboards.flush_all()
+            await storage.close_all()
 
 if __name__ == "__main__":
     load_dotenv()  # Load .env file for token
     token = os.getenv("DISCORD_TOKEN")
-    import asyncio
     asyncio.run(main())
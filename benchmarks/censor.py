@@ -0,0 +1,65 @@
+"""Micro-benchmark of time censoring over a corpus of run comments.
+
+Compares the old six re.sub passes against the single-pass engine and its
+batch API.
+
+Run from the repo root:  python -m benchmarks.censor
+"""
+import random
+import time
+
+from benchmarks.run_pool import replace_time_with_censored
+from utils.censor import censor_many, censor_times
+
+FRAGMENTS = [
+    "Finally sub {t}!",
+    "got the skip at {t} and died once at {s}",
+    "pb by 3 seconds, {t} RTA before removing loads",
+    "mod note: retimed to {t}",
+    "First run ever, had fun :)",
+    "lost ~10s on the hand scanner, otherwise clean.",
+    "splits: gas {s} / catbridge {t} / end {t}",
+    "thanks to everyone in chat <3",
+    "v1.2.3 patch, 60fps cap",
+]
+
+
+def make_corpus(size=5000):
+    rng = random.Random(2)
+
+    def a_time():
+        return rng.choice([
+            f"{rng.randint(0, 59)}:{rng.randint(0, 59):02d}",
+            f"{rng.randint(0, 59)}:{rng.randint(0, 59):02d}.{rng.randint(0, 999):03d}",
+            f"{rng.randint(0, 2)}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}",
+            f"{rng.randint(0, 2)}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}.{rng.randint(0, 999):03d}",
+        ])
+
+    corpus = []
+    for _ in range(size):
+        parts = rng.sample(FRAGMENTS, rng.randint(1, 4))
+        corpus.append(" ".join(p.format(t=a_time(), s=f"{rng.randint(0, 59)}.{rng.randint(0, 59):02d}") for p in parts))
+    return corpus
+
+
+def timed(label, func, rounds=5):
+    best = min(_run(func) for _ in range(rounds))
+    print(f"{label:<22} {best * 1000:8.2f} ms")
+
+
+def _run(func):
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+def main():
+    corpus = make_corpus()
+    print(f"{len(corpus)} comments")
+    timed("six passes", lambda: [replace_time_with_censored(c) for c in corpus])
+    timed("single pass", lambda: [censor_times(c) for c in corpus])
+    timed("single pass, batched", lambda: censor_many(corpus))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Measure warm-up requests with and without the on-disk HTTP cache.
+
+Each pass uses a fresh client, like a bot restart: the first pass starts
+with an empty cache file and the second reuses what the first one saved.
+
+Run from the repo root:  python -m benchmarks.cold_start
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+from commands.guess_the_time import CHAPTER_GAME_IDS
+from utils import storage
+from utils.speedrun import API_V1, SpeedrunClient
+
+USERS = ["Aoh_Nia"]
+
+
+async def warm_up(client):
+    started = time.perf_counter()
+    for game_id in CHAPTER_GAME_IDS.values():
+        params = {"game": game_id, "status": "verified", "orderby": "verify-date", "direction": "asc"}
+        await client.get_paginated(f"{API_V1}/runs", params=params)
+    for user in USERS:
+        await client.get_json(f"{API_V1}/users/{user}")
+    return time.perf_counter() - started
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "http_cache.db")
+        for label in ("empty disk cache", "reused disk cache"):
+            client = SpeedrunClient(disk_cache_path=path)
+            try:
+                elapsed = await warm_up(client)
+            finally:
+                await client.close()
+                await storage.close_all()
+            print(f"{label}: {elapsed:.2f}s {client.stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,25 @@
+"""Compare sequential and concurrent run fetching for every chapter.
+
+Run from the repo root:  python -m benchmarks.run_fetch
+"""
+import asyncio
+
+from commands.guess_the_time import CHAPTER_GAME_IDS
+from utils.speedrun import API_V1, client as speedrun
+
+
+async def main():
+    url = f"{API_V1}/runs"
+    try:
+        for chapter_key, game_id in CHAPTER_GAME_IDS.items():
+            params = {"game": game_id, "status": "verified", "orderby": "verify-date", "direction": "asc"}
+            # fan_out=1 is the old one-page-at-a-time walk
+            for fan_out in (1, 4, 8):
+                runs, stats = await speedrun.get_paginated(url, params=params, fan_out=fan_out)
+                print(f"{chapter_key} fan_out={fan_out}: {stats}")
+    finally:
+        await speedrun.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,117 @@
+"""Compare picking a Guess the Time run the old way against the prepared run pool.
+
+The old way filters the whole run list for comments on every call and then
+cleans and censors the chosen comment. The pool does that work once, when
+runs are indexed.
+
+Run from the repo root:  python -m benchmarks.run_pool
+"""
+import asyncio
+import os
+import random
+import re
+import tempfile
+import time
+
+from utils import storage
+from utils.run_index import RunIndex
+
+RUNS = 5000
+PICKS = 20000
+
+COMMENTS = [
+    "Finally sub 12:34! Got the skip at 1:05.300 and died once at 4.20",
+    "pb by 3 seconds, 1:02:03.456 RTA before removing loads",
+    "gg. mod note: retimed to 11:58.900",
+    "",
+    "First run ever, had fun :)",
+    None,
+    "lost ~10s on the hand scanner, otherwise clean. 09:41 / 9.41",
+]
+
+
+def make_runs():
+    rng = random.Random(1)
+    runs = []
+    for i in range(RUNS):
+        runs.append({
+            "id": f"run{i:05d}",
+            "comment": rng.choice(COMMENTS),
+            "date": "2024-05-01",
+            "times": {"primary_t": rng.uniform(300, 4000)},
+            "status": {"verify-date": f"2024-05-01T00:{i // 60 % 60:02d}:{i % 60:02d}Z"},
+        })
+    return runs
+
+
+# The per-call work /guess_time used to do
+def clean_description(description):
+    if not description:
+        return "No description available."
+    return re.sub(r"(mod\s*(note|message):.*)", "", description, flags=re.IGNORECASE).strip()
+
+
+def replace_time_with_censored(description):
+    if not description:
+        return description
+    time_patterns = [
+        r"\b(\d{1,2}):(\d{2})\b",
+        r"\b(\d{1,2}):(\d{2})\.(\d{1,3})\b",
+        r"\b(\d{1,2})\.(\d{2})\b",
+        r"\b(\d{1,2}):(\d{2}):(\d{2})\b",
+        r"\b(\d{1,2}):(\d{2}):(\d{2})\.(\d{1,3})\b",
+        r"\bCENSORED[:.0-9]+\b",
+    ]
+    for pattern in time_patterns:
+        description = re.sub(pattern, "~~__**CENSORED**__~~", description)
+    return description
+
+
+def old_pick(runs):
+    runs_with_description = [run for run in runs if run.get("comment")]
+    run = random.choice(runs_with_description)
+    return replace_time_with_censored(clean_description(run.get("comment")))
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as directory:
+        await compare(directory)
+
+
+async def compare(directory):
+    runs = make_runs()
+
+    started = time.perf_counter()
+    for _ in range(PICKS):
+        old_pick(runs)
+    old_elapsed = time.perf_counter() - started
+
+    index = RunIndex(storage.get_database(os.path.join(directory, "run_index.db")))
+    await index.open()
+    started = time.perf_counter()
+    rows = []
+    for run in runs:
+        comment = run["comment"]
+        if comment:
+            comment = clean_description(comment)
+            description = replace_time_with_censored(comment)
+        else:
+            comment = description = None
+        rows.append((run["id"], run["times"]["primary_t"], run["date"], comment, description,
+                     run["status"]["verify-date"]))
+    await index.add_runs("chapter_1", rows, rows[-1][-1])
+    build_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(PICKS):
+        index.random_run("chapter_1").description
+    new_elapsed = time.perf_counter() - started
+
+    print(f"{RUNS} runs, {PICKS} picks")
+    print(f"per-call filter + regex: {old_elapsed / PICKS * 1e6:8.2f} us/pick")
+    print(f"prepared pool:           {new_elapsed / PICKS * 1e6:8.2f} us/pick (built once in {build_elapsed * 1000:.1f} ms)")
+    await storage.close_all()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,43 @@
+"""Compare /trivia question selection before and after the in-memory question bank.
+
+Before: open and parse trivia_questions.json on every call, then build the
+lowercased options list the answer check used. After: pick from the bank.
+
+Run from the repo root:  python -m benchmarks.trivia_select
+"""
+import asyncio
+import json
+import random
+import time
+
+from utils.question_bank import QuestionBank
+
+PICKS = 5000
+
+
+def old_select():
+    with open('trivia_questions.json', 'r') as f:
+        question = random.choice(json.load(f)['questions'])
+    return [option.lower() for option in question['options']]
+
+
+async def main():
+    started = time.perf_counter()
+    for _ in range(PICKS):
+        old_select()
+    old_elapsed = time.perf_counter() - started
+
+    bank = QuestionBank("trivia_questions.json")
+    await bank.load()
+    started = time.perf_counter()
+    for _ in range(PICKS):
+        bank.random().options_lower
+    new_elapsed = time.perf_counter() - started
+
+    print(f"{len(bank.questions)} questions, {PICKS} picks")
+    print(f"read file per call: {old_elapsed / PICKS * 1e6:8.2f} us/pick")
+    print(f"question bank:      {new_elapsed / PICKS * 1e6:8.2f} us/pick")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,46 +1,64 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
-import sqlite3
-import requests
 import random
 import re
 import datetime
+from utils.answer_router import get_router
+from utils.censor import censor_many, censor_times
+from utils.game_session import ChannelSession
+from utils import sharding
+from utils.round_queue import RoundPrefetcher, make_round
+from utils.run_index import RunIndex
+from utils.speedrun import API_V1, SpeedrunError, client as speedrun
+from utils.leaderboards import get_game_scores
+from utils.storage import get_database
+
+# What a guess looks like: mm:ss or hh:mm:ss
+GUESS_PATTERN = re.compile(r"^\d{1,2}(:\d{2}){1,2}$")
+
+# How many guesses to list in the results before summarizing the rest
+MAX_RESULT_LINES = 15
+
+# speedrun.com game IDs for each chapter
+CHAPTER_GAME_IDS = {
+    "chapter_1": "w6j7vpx6",
+    "chapter_2": "4d7nqx36",
+    "chapter_3": "w6jge376"
+}
 
 class GuessTheTime(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.api_url = "https://www.speedrun.com/api/v1/runs"
-        self.chapter_game_ids = {
-            "chapter_1": "w6j7vpx6",
-            "chapter_2": "4d7nqx36",
-            "chapter_3": "w6jge376"
-        }
-        self.db_connection = sqlite3.connect("guess_time.db")
-        self.create_scores_table()
-
-    def create_scores_table(self):
-        """Create a table to store scores if it doesn't already exist."""
-        with self.db_connection:
-            self.db_connection.execute("""
-                CREATE TABLE IF NOT EXISTS scores (
-                    user_id INTEGER,
-                    username TEXT,
-                    score INTEGER DEFAULT 0,
-                    PRIMARY KEY (user_id)
-                )
-            """)
-
-    def update_score(self, user_id, username, points):
-        """Update the user's score in the database."""
-        with self.db_connection:
-            cursor = self.db_connection.execute("""
-                INSERT INTO scores (user_id, username, score)
-                VALUES (?, ?, ?)
-                ON CONFLICT(user_id)
-                DO UPDATE SET score = score + ?;
-            """, (user_id, username, points, points))
-        return cursor.rowcount > 0
+        self.router = get_router(bot)  # Delivers guesses without a bot.wait_for check per message
+        self.api_url = f"{API_V1}/runs"
+        self.chapter_game_ids = dict(CHAPTER_GAME_IDS)
+        self.fetch_fan_out = 4  # How many run pages to request at once
+        self.scores = get_game_scores("guess_time.db")  # Per-guild scores, written in batches
+        self.run_index = RunIndex(get_database("run_index.db"))  # Local copy of the runs, kept up to date by sync_runs
+        # Rounds prepared ahead of time; only the primary worker checks them upstream and prunes the shared index
+        self.rounds = RoundPrefetcher(self.run_index, self.chapter_game_ids, depth=5, verify=sharding.is_primary())
+
+    async def cog_load(self):
+        await self.scores.open()
+        await self.run_index.open()
+        if not sharding.is_primary():
+            # Only worker 0 talks to speedrun.com, the others just pick up its changes
+            self.sync_runs.change_interval(minutes=5)
+        self.sync_runs.start()
+        self.rounds.start()
+
+    async def cog_unload(self):
+        self.sync_runs.cancel()
+        self.rounds.stop()
+        await self.scores.close()
+
+    def update_scores(self, guild_id, entries):
+        """Give players points on this server's leaderboard; they're written to the database in the next batch.
+
+        `entries` is [(user_id, username, points), ...].
+        """
+        self.scores.add_many(guild_id, entries)
 
     async def fetch_all_runs_for_chapter(self, chapter_key):
         """Fetches all verified runs for a specific chapter."""
@@ -48,75 +66,131 @@ class GuessTheTime(commands.Cog):
         if not game_id:
             return None
 
-        # List to store all runs
-        all_runs = []
+        # Only verified runs, oldest verification first so new runs land on
+        # the last page instead of shifting the ones we're already fetching
+        params = {
+            "game": game_id,
+            "status": "verified",
+            "orderby": "verify-date",
+            "direction": "asc",
+        }
+
+        try:
+            all_runs, stats = await speedrun.get_paginated(self.api_url, params=params, page_size=200, fan_out=self.fetch_fan_out)
+        except SpeedrunError as e:
+            print(f"Error fetching runs for {chapter_key}: {e}")
+            return []
+
+        print(f"Fetched runs for {chapter_key}: {stats}")
+        return all_runs
+
+    async def fetch_new_runs_for_chapter(self, chapter_key, since):
+        """Fetches verified runs for a chapter that were verified at or after `since`."""
+        game_id = self.chapter_game_ids.get(chapter_key)
+        if not game_id:
+            return None
+
+        # Newest verification first, so we can stop at the first page that reaches `since`
+        new_runs = []
         offset = 0
         while True:
-            # Include the 'status' filter to only get verified runs
             params = {
                 "game": game_id,
-                "status": "verified",  # Only fetch verified runs
-                "max": 200,  # Fetch up to 200 runs per request (you can adjust this as needed)
-                "offset": offset,  # Offset for pagination
+                "status": "verified",
+                "orderby": "verify-date",
+                "direction": "desc",
+                "max": 200,
+                "offset": offset,
             }
+            try:
+                status, body = await speedrun.get_json(self.api_url, params=params)
+            except SpeedrunError as e:
+                print(f"Error fetching new runs for {chapter_key}: {e}")
+                return None
+            if status != 200:
+                print(f"Failed to fetch new runs for {chapter_key}. Status code: {status}")
+                return None
+
+            data = (body or {}).get("data", [])
+            for run in data:
+                if (run.get("status", {}).get("verify-date") or "") < since:
+                    return new_runs
+                new_runs.append(run)
+            if len(data) < 200:
+                return new_runs
+            offset += 200
+
+    async def sync_chapter(self, chapter_key):
+        """Brings the local run index up to date for one chapter."""
+        since = await self.run_index.last_verify_date(chapter_key)
+        if since is None:
+            runs = await self.fetch_all_runs_for_chapter(chapter_key)
+        else:
+            runs = await self.fetch_new_runs_for_chapter(chapter_key, since)
+        if not runs:
+            return
+
+        # Clean and censor every comment once here instead of on every round
+        comments = [self.clean_description(run["comment"]) if run.get("comment") else None for run in runs]
+        descriptions = censor_many(comments)
+
+        rows = []
+        newest = since
+        for run, comment, description in zip(runs, comments, descriptions):
+            verify_date = run.get("status", {}).get("verify-date")
+            rows.append((
+                run.get("id"),
+                run.get("times", {}).get("primary_t"),
+                run.get("date"),
+                comment,
+                description,
+                verify_date,
+            ))
+            if verify_date and (newest is None or verify_date > newest):
+                newest = verify_date
+
+        await self.run_index.add_runs(chapter_key, rows, newest)
+        print(f"Synced {len(rows)} runs for {chapter_key} ({self.run_index.count(chapter_key)} with a description).")
 
+    @tasks.loop(minutes=30)
+    async def sync_runs(self):
+        """Keeps the local run index in sync with speedrun.com in the background."""
+        if not sharding.is_primary():
+            if await self.run_index.reload_if_changed():
+                print("Reloaded runs synced by the primary worker.")
+            return
+        for chapter_key in self.chapter_game_ids:
             try:
-                response = requests.get(self.api_url, params=params, timeout=10)
-                if response.status_code == 200:
-                    data = response.json().get("data", [])
-                    if data:
-                        all_runs.extend(data)  # Add the runs to the list
-                        if len(data) < 200:  # No more runs available
-                            break
-                        offset += 200  # Increase offset for the next page of results
-                    else:
-                        print(f"No more runs found for {chapter_key}.")
-                        break
-                else:
-                    print(f"Failed to fetch runs for {chapter_key}. Status code: {response.status_code}")
-                    break
-            except requests.exceptions.RequestException as e:
-                print(f"Error fetching runs for {chapter_key}: {e}")
-                break
+                await self.sync_chapter(chapter_key)
+            except Exception as e:
+                print(f"Failed to sync runs for {chapter_key}: {e}")
+        print(f"speedrun.com cache: {speedrun.stats()}")
 
-        return all_runs
+    @sync_runs.before_loop
+    async def before_sync_runs(self):
+        await self.bot.wait_until_ready()
 
     def replace_time_with_censored(self, description):
         """Replaces any time in the description with 'CENSORED'."""
-        if not description:
-            return description
-        
-        # Regular expression to detect time format and replace with "CENSORED"
-        time_patterns = [
-            r"\b(\d{1,2}):(\d{2})\b",  # Matches mm:ss (e.g., 01:30)
-            r"\b(\d{1,2}):(\d{2})\.(\d{1,3})\b",  # Matches mm:ss.m or mm:ss.123 (e.g., 01:30.123)
-            r"\b(\d{1,2})\.(\d{2})\b",  # Matches mm.ss (e.g., 01.30)
-            r"\b(\d{1,2}):(\d{2}):(\d{2})\b",  # Matches hh:mm:ss (e.g., 01:30:45)
-            r"\b(\d{1,2}):(\d{2}):(\d{2})\.(\d{1,3})\b",  # Matches hh:mm:ss.m or hh:mm:ss.123 (e.g., 01:30:45.123)
-            r"\bCENSORED[:.0-9]+\b"  # Prevent replacing already censored times (e.g., CENSORED:10.000)
-        ]
-        
-        for pattern in time_patterns:
-            description = re.sub(pattern, "~~__**CENSORED**__~~", description)
-
-        return description  # Return the modified description
+        return censor_times(description)
 
     async def select_random_chapter(self):
-        """Selects a random chapter and fetches a random run."""
-        chapter_key = random.choice(list(self.chapter_game_ids.keys()))  # Randomly select a chapter
-        runs = await self.fetch_all_runs_for_chapter(chapter_key)
-        if not runs:
-            return chapter_key, None
-
-        # Filter out runs without descriptions
-        runs_with_description = [run for run in runs if run.get("comment")]
-
-        if not runs_with_description:
-            return chapter_key, None
+        """Selects a random chapter and takes a prepared round for it.
 
-        # Randomly select a run from the list of runs with descriptions
-        random_run = random.choice(runs_with_description)
-        return chapter_key, random_run
+        If the prefetch queue is empty, a round is built straight from the local index instead.
+        """
+        chapter_key = random.choice(list(self.chapter_game_ids.keys()))  # Randomly select a chapter
+        game_round = self.rounds.pop(chapter_key)
+        if game_round is None:
+            # A few tries in case we pick runs without a recorded time
+            for _ in range(5):
+                run = self.run_index.random_run(chapter_key)
+                if run is None:
+                    break
+                game_round = make_round(run)
+                if game_round is not None:
+                    break
+        return chapter_key, game_round
 
     def clean_description(self, description):
         """Cleans the run description by removing irrelevant content like mod notes."""
@@ -139,39 +213,43 @@ class GuessTheTime(commands.Cog):
     async def guess_time(self, interaction: discord.Interaction):
         await interaction.response.defer()
 
-        chapter_key, run = await self.select_random_chapter()
-        if not run:
-            await interaction.followup.send(f"No verified runs found for {chapter_key}. Try again later!")
+        # Everyone in the channel can guess, so only one round per channel at a time
+        session = ChannelSession(
+            interaction.channel_id,
+            parse=lambda content: content.strip() if GUESS_PATTERN.match(content.strip()) else None,
+            duration=30.0,
+        )
+        if not self.router.open_session(session):
+            await interaction.followup.send("A game is already running in this channel, answer that one first!")
             return
 
-        description = self.clean_description(run.get("comment"))
-        description = self.replace_time_with_censored(description)
-
-        time_in_seconds = run.get("times", {}).get("primary_t")
-        run_id = run.get("id")
-        run_date = run.get("date")  # Get the run's date
-        if time_in_seconds is None:
-            await interaction.followup.send("The selected run doesn't have a recorded time. Try again!")
+        chapter_key, game_round = await self.select_random_chapter()
+        if not game_round:
+            self.router.close_session(session)
+            await interaction.followup.send(f"No verified runs found for {chapter_key}. Try again later!")
             return
 
-        formatted_time = f"{int(time_in_seconds // 60)}:{int(time_in_seconds % 60):02d}"
-        run_url = f"https://www.speedrun.com/run/{run_id}"
+        # The round was prepared ahead of time: description censored, time formatted
+        description = game_round.description
+        run_date = game_round.run_date  # Get the run's date
+        formatted_time = game_round.formatted_time
+        run_url = game_round.run_url
 
         due_time = datetime.datetime.utcnow() + datetime.timedelta(hours=1, seconds=30)
         due_timestamp = int(due_time.timestamp())
 
-        await interaction.followup.send(
-            f"## **Guess the Time!**\n"
-            f"- **Chapter:** {chapter_key.replace('_', ' ').title()}\n"
-            f"- **Description:** {description}\n"
-            f"- **Run Date:** {run_date if run_date else 'Unknown'}\n"
-            f"⏰ **Time's up <t:{due_timestamp}:R>**"
-        )
+        try:
+            await interaction.followup.send(
+                f"## **Guess the Time!**\n"
+                f"- **Chapter:** {chapter_key.replace('_', ' ').title()}\n"
+                f"- **Description:** {description}\n"
+                f"- **Run Date:** {run_date if run_date else 'Unknown'}\n"
+                f"⏰ **Time's up <t:{due_timestamp}:R>**"
+            )
+        except Exception:
+            self.router.close_session(session)
+            raise
 
-        def check(msg):
-            pattern = r"^\d{1,2}(:\d{2}){1,2}$"
-            return msg.author == interaction.user and msg.channel == interaction.channel and re.match(pattern, msg.content.strip())
-        
         def calculate_score(difference):
             """Calculate points based on how close the guess is to the actual time."""
             if difference == 0:
@@ -184,42 +262,38 @@ class GuessTheTime(commands.Cog):
                 return 20  # Close within 30 seconds
             return 0  # Too far off
 
-        try:
-            user_message = await self.bot.wait_for("message", timeout=30.0, check=check)
-            user_guess = user_message.content.strip()
+        # Collect everyone's first guess until the time is up
+        guesses = await self.router.run_session(session)
+        if not guesses:
+            await interaction.followup.send(f"⏰ Time's up! The correct time was {formatted_time}.\n[Link to the run](<{run_url}>)")
+            return
+
+        # Score every guess, closest first
+        actual_seconds = self.time_to_seconds(formatted_time)
+        results = []
+        for author, user_guess in guesses:
+            difference = abs(actual_seconds - self.time_to_seconds(user_guess))
+            results.append((difference, author, calculate_score(difference)))
+        results.sort(key=lambda result: result[0])
 
-            actual_seconds = self.time_to_seconds(formatted_time)
-            guessed_seconds = self.time_to_seconds(user_guess)
-            difference = abs(actual_seconds - guessed_seconds)
-            points = calculate_score(difference)
+        # Everyone who scored is written in one batch
+        self.update_scores(interaction.guild_id, [(author.id, author.name, points) for _, author, points in results if points > 0])
 
+        lines = []
+        for difference, author, points in results[:MAX_RESULT_LINES]:
             if difference == 0:
-                # Perfect match
-                self.update_score(user_message.author.id, user_message.author.name, points)
-                await interaction.followup.send(
-                    f"🎉 Perfect! The time is {formatted_time}."
-                    f"\nYou earned **{points} points**!"
-                    f"\n[Link to the run](<{run_url}>)"
-                )
+                lines.append(f"🎉 **{author.name}** got it exactly! **+{points} points**")
             elif points > 0:
-                # Close but not exact
-                self.update_score(user_message.author.id, user_message.author.name, points)
-                await interaction.followup.send(
-                    f"👍 You were close! The difference was **{difference}** seconds."
-                    f"\nYou earned **{points} points**!"
-                    f"\nThe correct time was {formatted_time}."
-                    f"\n[Link to the run](<{run_url}>)"
-                )
+                lines.append(f"👍 **{author.name}** was off by **{difference}** seconds. **+{points} points**")
             else:
-                # Too far off
-                await interaction.followup.send(
-                    f"😢 Incorrect. The difference was **{difference}** seconds."
-                    f"\nThe correct time was {formatted_time}."
-                    f"\n[Link to the run](<{run_url}>)"
-                )
-
-        except Exception:
-            await interaction.followup.send(f"⏰ Time's up! The correct time was {formatted_time}.\n[Link to the run](<{run_url}>)")
+                lines.append(f"😢 **{author.name}** was off by **{difference}** seconds.")
+        if len(results) > MAX_RESULT_LINES:
+            lines.append(f"...and {len(results) - MAX_RESULT_LINES} more guesses.")
+        await interaction.followup.send(
+            f"The correct time was {formatted_time}.\n"
+            + "\n".join(lines)
+            + f"\n[Link to the run](<{run_url}>)"
+        )
 
 async def setup(bot):
     await bot.add_cog(GuessTheTime(bot))
\ No newline at end of file
@@ -1,49 +1,56 @@
 import discord
 from discord.ext import commands
-import sqlite3
 import traceback
+from utils.leaderboards import COMBINED_PATH, get_game_scores
+
+PER_PAGE = 10
 
 class Leaderboard(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        # Use separate database connections for each game
-        self.guess_time_db_connection = sqlite3.connect("guess_time.db")  
-        self.trivia_db_connection = sqlite3.connect("trivia.db")  
+        # The same per-guild scores the games write to
+        self.games = {
+            "trivia": ("Trivia", get_game_scores("trivia.db")),
+            "guess_time": ("Guess Time", get_game_scores("guess_time.db")),
+            "all": ("All Games", get_game_scores(COMBINED_PATH)),
+        }
+
+    async def cog_load(self):
+        for _, scores in self.games.values():
+            await scores.open()
 
-    @discord.app_commands.command(name="leaderboard", description="Display the leaderboard for a specific game.")
-    @discord.app_commands.describe(game="Specify the game: 'trivia' or 'guess_time'")
-    async def leaderboard(self, interaction: discord.Interaction, game: str):
+    @discord.app_commands.command(name="leaderboard", description="Display this server's leaderboard for a specific game.")
+    @discord.app_commands.describe(
+        game="Specify the game: 'trivia', 'guess_time' or 'all'",
+        page="Which page of the leaderboard to show (10 players per page)",
+    )
+    async def leaderboard(self, interaction: discord.Interaction, game: str, page: int = 1):
         try:
             # Determine which leaderboard to query based on the 'game' argument
-            if game not in ["trivia", "guess_time"]:
-                await interaction.response.send_message("Invalid game type! Use 'trivia' or 'guess_time'.")
+            if game not in self.games:
+                await interaction.response.send_message("Invalid game type! Use 'trivia', 'guess_time' or 'all'.")
                 return
+            game_name, scores = self.games[game]
+            page = max(page, 1)
 
-            # Choose the appropriate database connection and table based on the game type
-            if game == "trivia":
-                db_connection = self.trivia_db_connection
-                table_name = "scores"
-                game_name = "Trivia"
-            else:
-                db_connection = self.guess_time_db_connection
-                table_name = "scores"
-                game_name = "Guess Time"
-
-            # Query the leaderboard from the respective table
-            with db_connection:
-                cursor = db_connection.execute(f"""
-                    SELECT username, score FROM {table_name} ORDER BY score DESC LIMIT 10
-                """)
-                rows = cursor.fetchall()
-
+            rows, total = await scores.page(interaction.guild_id, page, PER_PAGE)
             if not rows:
-                await interaction.response.send_message(f"No scores yet for {game_name}! Be the first to play!")
+                if total:
+                    await interaction.response.send_message(f"There are only {(total - 1) // PER_PAGE + 1} pages on the {game_name} leaderboard.")
+                else:
+                    await interaction.response.send_message(f"No scores yet for {game_name}! Be the first to play!")
                 return
 
             # Prepare the leaderboard message
             leaderboard = f"**🏆 {game_name} Leaderboard 🏆**\n"
-            for rank, (username, score) in enumerate(rows, start=1):
+            for rank, _, username, score in rows:
                 leaderboard += f"{rank}. **{username}** - {score} points\n"
+            leaderboard += f"-# Page {page}/{(total - 1) // PER_PAGE + 1}"
+
+            # Show where the user stands, even if they're not on this page
+            own_rank = await scores.rank(interaction.guild_id, interaction.user.id)
+            if own_rank:
+                leaderboard += f" · You're **#{own_rank[0]}** with {own_rank[1]} points"
 
             # Send the leaderboard to the user
             await interaction.response.send_message(leaderboard)
@@ -56,4 +63,4 @@ class Leaderboard(commands.Cog):
 
 # Async setup function to add the cog
 async def setup(bot):
-    await bot.add_cog(Leaderboard(bot))
\ No newline at end of file
+    await bot.add_cog(Leaderboard(bot))
@@ -1,100 +1,40 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import sqlite3
-
-# Create database and table if they don't exist
-def create_tables():
-    conn = sqlite3.connect('buttons.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS message_data (
-        message_id TEXT PRIMARY KEY,
-        channel_id INTEGER,
-        guild_id INTEGER
-    )
-    ''')
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS button_data (
-        message_id TEXT,
-        button_name TEXT,
-        button_id TEXT,
-        role_id INTEGER,
-        FOREIGN KEY(message_id) REFERENCES message_data(message_id)
-    )
-    ''')
-    conn.commit()
-    conn.close()
-    print("Database and tables created (if not exist).")
-
-# Save message data (message_id, channel_id, guild_id) into the database
-def save_message_data(message_id, channel_id, guild_id, buttons_data):
-    try:
-        conn = sqlite3.connect('buttons.db')
-        cursor = conn.cursor()
-        cursor.execute('INSERT OR REPLACE INTO message_data (message_id, channel_id, guild_id) VALUES (?, ?, ?)', 
-                       (message_id, channel_id, guild_id))
-        for button_name, button_id, role_id in buttons_data:
-            cursor.execute('INSERT INTO button_data (message_id, button_name, button_id, role_id) VALUES (?, ?, ?, ?)',
-                           (message_id, button_name, button_id, role_id))
-        conn.commit()
-        conn.close()
-        print(f"Successfully saved message data: message_id={message_id}, channel_id={channel_id}, guild_id={guild_id}.")
-    except Exception as e:
-        print(f"Error saving message data: {e}")
-
-# Remove existing message data from the database
-def remove_existing_message_data():
-    try:
-        conn = sqlite3.connect('buttons.db')
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM message_data')
-        cursor.execute('DELETE FROM button_data')
-        conn.commit()
-        conn.close()
-        print("Successfully removed previous message data from the database.")
-    except Exception as e:
-        print(f"Error removing message data: {e}")
-
-# Get message data (message_id, channel_id, guild_id) and button data from the database
-def get_message_data():
-    try:
-        conn = sqlite3.connect('buttons.db')
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM message_data ORDER BY rowid DESC LIMIT 1')
-        message_data = cursor.fetchone()
-
-        if message_data:
-            cursor.execute('SELECT button_name, button_id, role_id FROM button_data WHERE message_id = ?', (message_data[0],))
-            buttons_data = cursor.fetchall()
-            conn.close()
-            return message_data, buttons_data
-        else:
-            conn.close()
-            return None, None
-    except Exception as e:
-        print(f"Error fetching message data: {e}")
-        return None, None
-
-# Remove invalid message data (if channel is not found, etc.)
-def remove_invalid_message_data():
-    try:
-        conn = sqlite3.connect('buttons.db')
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM message_data')
-        cursor.execute('DELETE FROM button_data')
-        conn.commit()
-        conn.close()
-        print("Removed invalid message data from the database.")
-    except Exception as e:
-        print(f"Error removing invalid message data: {e}")
-
-# Role Buttons View
-class RoleButtons(discord.ui.View):
-    def __init__(self, buttons_data=None):
-        super().__init__(timeout=None)  # The message stays indefinitely
-        if buttons_data:
-            self.generate_buttons(buttons_data)
+from typing import Optional
+from utils.role_panels import RolePanelStore
+from utils.role_queue import RoleMutationQueue
+from utils.storage import get_database
+
+# Discord allows 5 buttons per row; one row is plenty for a panel
+MAX_PANEL_ROLES = 5
+
+# Stable, unique per (guild, role), so the same role on two panels shares one index entry
+def role_custom_id(guild_id, role_id):
+    return f"role:{guild_id}:{role_id}"
+
+# The buttons for a panel. The view is stopped before it's sent so discord.py doesn't
+# keep an object per panel around; clicks are handled by RoleCommand.on_interaction
+def panel_view(buttons):
+    view = discord.ui.View(timeout=None)
+    for label, custom_id, _ in buttons:
+        view.add_item(discord.ui.Button(label=label, custom_id=custom_id, style=discord.ButtonStyle.primary))
+    view.stop()
+    return view
+
+# Role Command Cog
+class RoleCommand(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.panels = RolePanelStore(get_database('buttons.db'))  # Every role panel and the custom_id index
+        self.queue = RoleMutationQueue(delay=1.0)  # Merges each member's clicks into one role edit
+        print("RoleCommand cog initialized.")
+
+    async def cog_load(self):
+        await self.panels.open()  # Make sure the tables exist and build the button index
+
+    async def cog_unload(self):
+        await self.queue.close()
 
     async def toggle_role(self, interaction: discord.Interaction, role_id: int):
         guild = interaction.guild
@@ -108,102 +48,97 @@ class RoleButtons(discord.ui.View):
             print(f"Role with ID {role_id} not found in guild {guild.name}.")
             return
 
-        if role in interaction.user.roles:
-            await interaction.user.remove_roles(role)
-            await interaction.response.send_message(f"Removed {role.name} role!", ephemeral=True)
-            print(f"Removed {role.name} role for {interaction.user.name}.")
-        else:
-            await interaction.user.add_roles(role)
+        # Answer straight away; the change itself is queued and sent with the member's other clicks
+        if self.queue.toggle(interaction.user, role, interaction):
             await interaction.response.send_message(f"Added {role.name} role!", ephemeral=True)
-            print(f"Added {role.name} role for {interaction.user.name}.")
-
-    def generate_buttons(self, buttons_data):
-        print("Generating buttons.")
-        for button_name, button_id, role_id in buttons_data:
-            button = discord.ui.Button(label=button_name, custom_id=button_id, style=discord.ButtonStyle.primary)
-            button.callback = lambda interaction, role_id=role_id: self.toggle_role(interaction, role_id)
-            self.add_item(button)
+        else:
+            await interaction.response.send_message(f"Removed {role.name} role!", ephemeral=True)
 
-# Role Command Cog
-class RoleCommand(commands.Cog):
-    def __init__(self, bot):
-        self.bot = bot
-        create_tables()  # Make sure the database and table are created when the bot starts
-        print("RoleCommand cog initialized.")
+    # Every role button click in every guild comes through here
+    @commands.Cog.listener()
+    async def on_interaction(self, interaction: discord.Interaction):
+        if interaction.type != discord.InteractionType.component:
+            return
+        target = self.panels.lookup((interaction.data or {}).get("custom_id"))
+        if target is None:
+            return
+        guild_id, role_id = target
+        if interaction.guild_id != guild_id:
+            return
+        await self.toggle_role(interaction, role_id)
 
     @app_commands.command(name="roles", description="Create a message with buttons to receive roles.")
     @app_commands.default_permissions(administrator=True)
-    async def roles(self, interaction: discord.Interaction):
-        # Remove any existing data before saving new data
-        remove_existing_message_data()
+    @app_commands.guild_only()
+    @app_commands.describe(
+        role1="A role members can toggle",
+        role2="Another role",
+        role3="Another role",
+        role4="Another role",
+        role5="Another role",
+        title="The message above the buttons",
+    )
+    async def roles(self, interaction: discord.Interaction, role1: discord.Role, role2: Optional[discord.Role] = None,
+                    role3: Optional[discord.Role] = None, role4: Optional[discord.Role] = None,
+                    role5: Optional[discord.Role] = None, title: Optional[str] = None):
+        roles = []
+        for role in (role1, role2, role3, role4, role5):
+            if role is not None and role not in roles:
+                roles.append(role)
+
+        # The bot can only hand out roles below its own
+        me = interaction.guild.me
+        too_high = [role.name for role in roles if role >= me.top_role or role.managed or role.is_default()]
+        if too_high:
+            await interaction.response.send_message(
+                f"I can't give out these roles: {', '.join(too_high)}. Move my role above them first.", ephemeral=True)
+            return
 
         embed = discord.Embed(
-            title="Click to receive the role for the Chapter specified!",
+            title=title or "Click to receive a role!",
             description="Click the buttons below to toggle the roles:",
             color=discord.Color.blue()
         )
         print(f"Sending role selection message in channel {interaction.channel.name}.")
 
-        # Define buttons and their roles
-        buttons_data = [
-            ("Chapter 1", "role_ch1", 1345154403216392293),
-            ("Chapter 2", "role_ch2", 1345154701423018064),
-            ("Chapter 3", "role_ch3", 1345154689729040536),
-            ("Chapter 4", "role_ch4", 1345154697329119234)
-        ]
+        buttons = [(role.name, role_custom_id(interaction.guild.id, role.id), role.id) for role in roles[:MAX_PANEL_ROLES]]
 
         # Send message with role buttons
-        message = await interaction.channel.send(embed=embed, view=RoleButtons(buttons_data))
+        message = await interaction.channel.send(embed=embed, view=panel_view(buttons))
 
-        # Save message, channel, guild, and button data to the database
-        save_message_data(message.id, message.channel.id, interaction.guild.id, buttons_data)
+        # Save the panel and add its buttons to the index
+        try:
+            await self.panels.add_panel(message.id, message.channel.id, interaction.guild.id, buttons)
+            print(f"Saved role panel {message.id} in guild {interaction.guild.id} "
+                  f"({self.panels.panel_count(interaction.guild.id)} panels there).")
+        except Exception as e:
+            print(f"Error saving role panel: {e}")
 
         await interaction.response.send_message("Role selection message created!", ephemeral=True)
 
-    # Restore roles (called automatically when the bot starts)
-    async def restore_roles(self):
-        print("Attempting to restore roles...")
-        message_data, buttons_data = get_message_data()
-        if message_data is None or buttons_data is None:
-            print("No previous message data found to restore.")
-            return
+    @app_commands.command(name="role_queue", description="Show how many role changes are waiting and how long they take.")
+    @app_commands.default_permissions(administrator=True)
+    async def role_queue(self, interaction: discord.Interaction):
+        stats = self.queue.stats()
+        await interaction.response.send_message(
+            f"**Members waiting:** {stats['depth']} ({stats['queued_changes']} role changes)\n"
+            f"**Edits sent:** {stats['edits']} ({stats['merged']} clicks merged, {stats['failures']} failed)\n"
+            f"**Latency:** avg {stats['latency_avg']:.2f}s, p95 {stats['latency_p95']:.2f}s, max {stats['latency_max']:.2f}s",
+            ephemeral=True,
+        )
 
-        message_id, channel_id, guild_id = message_data
-        try:
-            # Fetch the saved guild
-            guild = self.bot.get_guild(guild_id)
-            if guild is None:
-                print(f"Guild with ID {guild_id} not found.")
-                self.remove_invalid_message_data()
-                return
-
-            # Fetch the saved channel
-            channel = guild.get_channel(channel_id)
-            if channel is None:
-                print(f"Channel with ID {channel_id} not found in guild {guild.name}.")
-                self.remove_invalid_message_data()
-                return
-
-            # Fetch the saved message and re-add the buttons
-            message = await channel.fetch_message(message_id)
-            view = RoleButtons(buttons_data)
-            await message.edit(view=view)
-            print(f"Restored the role selection message with buttons in channel {channel.name}!")
-
-        except discord.NotFound:
-            print("The saved message could not be found.")
-            self.remove_invalid_message_data()
-
-        except discord.Forbidden:
-            print("The bot does not have permission to access the channel.")
-        
-        except discord.HTTPException as e:
-            print(f"An HTTP error occurred while restoring the roles: {e}")
-
-    # Ensure roles are restored when the bot starts up
+    # Forget role panels that were deleted
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload):
+        if await self.panels.remove_panel(payload.message_id):
+            print(f"Removed the deleted role selection message {payload.message_id}.")
+
+    # And every panel in a guild the bot was removed from
     @commands.Cog.listener()
-    async def on_ready(self):
-        await self.restore_roles()
+    async def on_guild_remove(self, guild):
+        removed = await self.panels.remove_guild(guild.id)
+        if removed:
+            print(f"Removed {removed} role panels from {guild.name}.")
 
 # Set up the cog
 async def setup(bot):
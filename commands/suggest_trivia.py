@@ -2,10 +2,12 @@ import discord
 from discord.ext import commands
 from discord.ui import Button, View
 import asyncio
+from utils.answer_router import get_router
 
 class Suggest(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.router = get_router(bot)  # Delivers DM replies without a bot.wait_for check per message
 
     @discord.app_commands.command(name="suggest_trivia_question", description="Suggest a trivia question!")
     async def suggest_trivia_question(self, interaction: discord.Interaction):
@@ -38,23 +40,22 @@ class Suggest(commands.Cog):
         # Send the message asking for the trivia question
         question_msg = await user.send("What's the trivia question?", view=view)
 
-        # Wait for the user's response or cancellation
-        def check(m):
-            return m.author == user and isinstance(m.channel, discord.DMChannel)
+        # Wait for the user's responses in this DM channel
+        dm_channel_id = question_msg.channel.id
 
         try:
             # Wait for the question input
-            question_input = await self.bot.wait_for('message', check=check, timeout=300)  # 5 minutes timeout
+            question_input = await self.router.wait_for(dm_channel_id, user.id, timeout=300)  # 5 minutes timeout
             question = question_input.content
 
             # Ask for the options
             options_msg = await user.send(f"Thank you! Now, what's the options for the question: ``{question}``")
-            options_input = await self.bot.wait_for('message', check=check)
+            options_input = await self.router.wait_for(dm_channel_id, user.id)
             options = options_input.content
 
             # Ask for the correct answer
             answer_msg = await user.send("Finally, what's the correct answer from the options?")
-            answer_input = await self.bot.wait_for('message', check=check)
+            answer_input = await self.router.wait_for(dm_channel_id, user.id)
             correct_answer = answer_input.content
 
             # Send the suggestion to the private server #suggestions channel
@@ -80,7 +81,7 @@ class Suggest(commands.Cog):
             # Acknowledge to the user
             await user.send("Your trivia question has been submitted successfully!")
 
-        except discord.errors.TimeoutError:
+        except asyncio.TimeoutError:
             await user.send("You took too long to respond, submission has been canceled.")
 
             # Delete all the messages after timeout
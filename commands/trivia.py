@@ -1,93 +1,111 @@
 import discord
-import random
-import json
-import sqlite3
 from discord.ext import commands
 from discord import app_commands
 import datetime
+from utils.leaderboards import get_game_scores
+from utils.answer_router import get_router
+from utils.decks import DeckScheduler
+from utils.game_session import ChannelSession
+from utils.question_bank import QuestionBank
+from utils.storage import get_database
 
 class Trivia(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.db_connection = sqlite3.connect("trivia.db")
-        self.create_scores_table()
-
-    def create_scores_table(self):
-        """Create a table to store scores if it doesn't already exist."""
-        with self.db_connection:
-            self.db_connection.execute("""
-                CREATE TABLE IF NOT EXISTS scores (
-                    user_id INTEGER,
-                    username TEXT,
-                    score INTEGER DEFAULT 0,
-                    PRIMARY KEY (user_id)
-                )
-            """)
-
-    def update_score(self, user_id, username, points):
-        """Update the user's score in the database."""
-        with self.db_connection:
-            cursor = self.db_connection.execute("""
-                INSERT INTO scores (user_id, username, score)
-                VALUES (?, ?, ?)
-                ON CONFLICT(user_id)
-                DO UPDATE SET score = score + ?;
-            """, (user_id, username, points, points))
-        return cursor.rowcount > 0
-
-    async def load_questions(self):
-        """Load trivia questions from a JSON file."""
-        with open('trivia_questions.json', 'r') as f:
-            return json.load(f)
-
-    async def select_random_question(self):
-        """Select a random trivia question."""
-        questions = await self.load_questions()
-        return random.choice(questions['questions'])
+        self.router = get_router(bot)  # Delivers answers without a bot.wait_for check per message
+        self.scores = get_game_scores("trivia.db")  # Per-guild scores, written in batches
+        self.questions = QuestionBank("trivia_questions.json")  # Reloaded automatically when the file changes
+        self.decks = DeckScheduler(get_database("trivia.db"), self.questions)  # No repeats until a channel has seen every question
+
+    async def cog_load(self):
+        await self.scores.open()
+        await self.questions.load()
+        await self.decks.create_table()
+        self.questions.start_watching()
+
+    async def cog_unload(self):
+        self.questions.stop_watching()
+        await self.scores.close()  # Write any points that haven't been flushed yet
+
+    def update_scores(self, guild_id, entries):
+        """Give players points on this server's leaderboard; they're written to the database in the next batch.
+
+        `entries` is [(user_id, username, points), ...].
+        """
+        self.scores.add_many(guild_id, entries)
+
+    async def select_random_question(self, channel_id, tag=None):
+        """Deal the next trivia question from this channel's deck."""
+        return await self.decks.deal(channel_id, tag)
 
     @app_commands.command(name="trivia", description="Guess the answer to a random trivia question!")
-    async def trivia(self, interaction: discord.Interaction):
+    @app_commands.describe(tag="Only ask questions with this tag or difficulty")
+    async def trivia(self, interaction: discord.Interaction, tag: str = None):
         await interaction.response.defer()
 
-        # Select a random trivia question
-        question = await self.select_random_question()
-        question_text = question['question']
-        options = question['options']
-        answer = question['answer']
+        # Everyone in the channel can answer, so only one round per channel at a time.
+        # The session ignores messages until parse is set below, once the question is dealt
+        session = ChannelSession(interaction.channel_id, parse=None, duration=30.0)
+        if not self.router.open_session(session):
+            await interaction.followup.send("A game is already running in this channel, answer that one first!")
+            return
+
+        try:
+            # Deal the next trivia question for this channel
+            question = await self.select_random_question(interaction.channel_id, tag.lower() if tag else None)
+        except Exception:
+            self.router.close_session(session)
+            raise
+        if question is None:
+            self.router.close_session(session)
+            await interaction.followup.send(f"No trivia questions are tagged '{tag}'. Available tags: {', '.join(self.questions.tags()) or 'none'}.")
+            return
+        question_text = question.text
+        options = question.options
+        answer = question.answer
+
+        # Only the options count as answers
+        def parse(content):
+            content = content.strip().lower()
+            return content if content in question.options_lower else None
+        session.parse = parse
 
         # Calculate the time limit (30 seconds from now)
         due_time = datetime.datetime.utcnow() + datetime.timedelta(hours=1, seconds=30)  # 30 seconds limit
         due_timestamp = int(due_time.timestamp())
 
-        # Send the question to the user with the time limit
+        # Send the question to the channel with the time limit
         message = f"**Question:** {question_text}\n"
         for idx, option in enumerate(options, 1):
             message += f"{idx}. {option}\n"
         message += f"⏰ **Time's up <t:{due_timestamp}:R>**"
-        
-        await interaction.followup.send(message)
-
-        # Wait for the user's answer
-        def check(msg):
-            return msg.author == interaction.user and msg.channel == interaction.channel and msg.content.strip().lower() in [option.lower() for option in options]
 
         try:
-            user_message = await self.bot.wait_for("message", timeout=30.0, check=check)
-            user_answer = user_message.content.strip().lower()
-
-            if user_answer == answer.lower():
-                points = 50  # Perfect answer gives 50 points
-                self.update_score(user_message.author.id, user_message.author.name, points)
-                await interaction.followup.send(
-                    f"🎉 Correct! The answer is {answer}.\nYou earned **{points} points**!"
-                )
-            else:
-                await interaction.followup.send(
-                    f"😢 Incorrect. The correct answer was: {answer}."
-                )
-
+            await interaction.followup.send(message)
         except Exception:
+            self.router.close_session(session)
+            raise
+
+        # Collect everyone's first answer until the time is up
+        answers = await self.router.run_session(session)
+        if not answers:
             await interaction.followup.send(f"⏰ Time's up! The correct answer was {answer}.")
+            return
+
+        points = 50  # Perfect answer gives 50 points
+        winners = [author for author, user_answer in answers if user_answer == question.answer_lower]
+        if not winners:
+            await interaction.followup.send(f"😢 Nobody got it. The correct answer was: {answer}.")
+            return
+
+        # Everyone who got it right is scored in one batch
+        self.update_scores(interaction.guild_id, [(author.id, author.name, points) for author in winners])
+        names = ", ".join(f"**{author.name}**" for author in winners[:20])
+        if len(winners) > 20:
+            names += f" and {len(winners) - 20} more"
+        await interaction.followup.send(
+            f"🎉 Correct! The answer is {answer}.\n{names} earned **{points} points**!"
+        )
 
 # Async setup function to add the cog
 async def setup(bot):
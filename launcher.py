@@ -0,0 +1,89 @@
+"""Run AyayaBot as several worker processes, each with its own shards.
+
+    python launcher.py --shards 4 --workers 2
+    python launcher.py --shards 4 --workers 2 --stub   # try it locally without Discord
+
+Every worker is a normal `ayayabot.py` using AutoShardedBot for its share
+of the shards. They share the SQLite files in the working directory, so
+scores, links and the HTTP cache stay consistent; worker 0 syncs the
+command tree and the speedrun.com runs, and the speedrun.com rate limit
+is split between the workers.
+
+With --stub, workers don't connect to Discord. They play fake rounds for
+the guilds their shards own (see utils/stub_gateway.py) in a scratch
+directory and check that everyone's scores show up on the shared boards.
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+
+from utils.sharding import split_shards
+
+BOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ayayabot.py")
+
+
+def worker_env(worker_id, workers, shard_ids, shard_count, stub):
+    env = dict(os.environ)
+    env.update({
+        "WORKER_ID": str(worker_id),
+        "WORKER_COUNT": str(workers),
+        "SHARD_COUNT": str(shard_count),
+        "SHARD_IDS": ",".join(str(shard_id) for shard_id in shard_ids),
+        # Each worker gets its share of speedrun.com's rate limit
+        "SPEEDRUN_RATE_PER_MINUTE": str(max(1, int(os.getenv("SPEEDRUN_RATE_PER_MINUTE", "100")) // workers)),
+    })
+    if stub:
+        env["STUB_GATEWAY"] = "1"
+    return env
+
+
+def launch(shard_count, workers, stub=False, directory=None):
+    """Start the workers, wait for them all and return the worst exit code."""
+    groups = split_shards(shard_count, workers)
+    processes = []
+    for worker_id, shard_ids in enumerate(groups):
+        print(f"Starting worker {worker_id} with shards {shard_ids}")
+        processes.append(subprocess.Popen(
+            [sys.executable, BOT],
+            cwd=directory,
+            env=worker_env(worker_id, len(groups), shard_ids, shard_count, stub),
+        ))
+
+    def stop(signum, frame):
+        for process in processes:
+            if process.poll() is None:
+                process.send_signal(signal.SIGINT)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    exit_code = 0
+    for worker_id, process in enumerate(processes):
+        code = process.wait()
+        if code != 0:
+            print(f"Worker {worker_id} exited with code {code}")
+            exit_code = exit_code or code
+    return exit_code
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shards", type=int, default=int(os.getenv("SHARD_COUNT", "2")), help="Total number of shards")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WORKER_COUNT", "1")), help="Number of processes to split them across")
+    parser.add_argument("--stub", action="store_true", help="Use the stand-in gateway instead of connecting to Discord")
+    args = parser.parse_args()
+
+    if args.stub:
+        with tempfile.TemporaryDirectory() as directory:
+            code = launch(args.shards, args.workers, stub=True, directory=directory)
+        print("Stand-in gateway run " + ("passed" if code == 0 else "failed"))
+    else:
+        code = launch(args.shards, args.workers)
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,4 @@
 #!/bin/bash
-python3 ayayabot.py
\ No newline at end of file
+# Set LEGACY_GUILD_ID to the server the old global leaderboard belonged to, so its
+# scores show up there instead of only in DMs (the bot warns at startup until it's set)
+python3 ayayabot.py
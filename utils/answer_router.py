@@ -0,0 +1,85 @@
+import asyncio
+
+
+class AnswerRouter:
+    """Routes incoming messages to the game waiting on them.
+
+    Games register what they're waiting for under (channel_id, user_id), or
+    open a channel-wide session that takes answers from anyone, so each
+    message costs at most two dict lookups instead of running every pending
+    bot.wait_for check. Waiters are removed when they get their message,
+    time out or are cancelled.
+    """
+
+    def __init__(self):
+        self._waiters = {}  # (channel_id, user_id) -> [(future, check), ...]
+        self._sessions = {}  # channel_id -> utils.game_session.ChannelSession
+
+    async def on_message(self, message):
+        waiters = self._waiters.get((message.channel.id, message.author.id))
+        if not waiters:
+            session = self._sessions.get(message.channel.id)
+            if session is not None:
+                session.offer(message)
+            return
+        for future, check in waiters:
+            if future.done():
+                continue
+            try:
+                if check is not None and not check(message):
+                    continue
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            future.set_result(message)
+            return
+
+    async def wait_for(self, channel_id, user_id, check=None, timeout=None):
+        """Wait for the next message from a user in a channel that passes `check`.
+
+        Raises asyncio.TimeoutError like bot.wait_for.
+        """
+        key = (channel_id, user_id)
+        entry = (asyncio.get_running_loop().create_future(), check)
+        self._waiters.setdefault(key, []).append(entry)
+        try:
+            return await asyncio.wait_for(entry[0], timeout)
+        finally:
+            waiters = self._waiters.get(key)
+            if waiters is not None:
+                waiters.remove(entry)
+                if not waiters:
+                    del self._waiters[key]
+
+    def open_session(self, session):
+        """Start sending a channel's messages to a session. Returns False if the channel already has one."""
+        if session.channel_id in self._sessions:
+            return False
+        self._sessions[session.channel_id] = session
+        return True
+
+    def close_session(self, session):
+        session.close()
+        if self._sessions.get(session.channel_id) is session:
+            del self._sessions[session.channel_id]
+
+    async def run_session(self, session):
+        """Wait for an open session's window to end, close it and return its answers."""
+        try:
+            return await session.wait()
+        finally:
+            self.close_session(session)
+
+    def pending(self):
+        """Number of games currently waiting for an answer."""
+        return sum(len(waiters) for waiters in self._waiters.values()) + len(self._sessions)
+
+
+def get_router(bot):
+    """Return the bot's router, creating it and hooking it to on_message on first use."""
+    router = getattr(bot, "answer_router", None)
+    if router is None:
+        router = AnswerRouter()
+        bot.answer_router = router
+        bot.add_listener(router.on_message, "on_message")
+    return router
@@ -0,0 +1,117 @@
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+
+class CacheEntry:
+    """One cached response."""
+
+    __slots__ = ("status", "data", "size", "stored_at", "ttl", "stale_ttl")
+
+    def __init__(self, status, data, size, ttl, stale_ttl, age=0.0):
+        self.status = status
+        self.data = data
+        self.size = size
+        self.stored_at = time.monotonic() - age
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+
+    def age(self):
+        return time.monotonic() - self.stored_at
+
+
+class ResponseCache:
+    """In-memory LRU cache of speedrun.com responses with stale-while-revalidate.
+
+    Entries are keyed by URL and params. Each endpoint gets a TTL and a stale
+    window from `ttl_rules`: inside the TTL an entry is fresh, inside the
+    stale window after it the entry is still served but should be refreshed
+    in the background, and after that it's a miss. The total size of the
+    cached bodies is kept under `max_bytes` by evicting the least recently
+    used entries.
+    """
+
+    def __init__(self, ttl_rules, default_ttl=60, default_stale_ttl=0, max_bytes=32 * 1024 * 1024):
+        # [(path prefix, ttl seconds, stale seconds), ...], first match wins
+        self.ttl_rules = list(ttl_rules)
+        self.default_ttl = default_ttl
+        self.default_stale_ttl = default_stale_ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self.size = 0
+
+        # Counters for sizing the cache
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refreshes = 0
+
+    @staticmethod
+    def make_key(url, params=None):
+        if not params:
+            return url
+        return url + "?" + "&".join(f"{k}={v}" for k, v in sorted(params.items()))
+
+    def ttls_for(self, url):
+        """Return (ttl, stale_ttl) for the endpoint a URL belongs to."""
+        path = urlsplit(url).path
+        for prefix, ttl, stale_ttl in self.ttl_rules:
+            if path.startswith(prefix):
+                return ttl, stale_ttl
+        return self.default_ttl, self.default_stale_ttl
+
+    def get(self, key):
+        """Return (entry, is_stale), or (None, False) on a miss."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = entry.age()
+            if age <= entry.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry, False
+            if age <= entry.ttl + entry.stale_ttl:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                return entry, True
+            self._remove(key)
+        self.misses += 1
+        return None, False
+
+    def put(self, key, url, status, data, size, age=0.0):
+        """Store a response, evicting old entries to stay under max_bytes.
+
+        `age` is how old the response already is, for entries loaded from disk.
+        """
+        ttl, stale_ttl = self.ttls_for(url)
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = CacheEntry(status, data, size, ttl, stale_ttl, age)
+        self.size += size
+        while self.size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.size -= entry.size
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def stats(self):
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "refreshes": self.refreshes,
+            "hit_ratio": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+        }
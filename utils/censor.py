@@ -0,0 +1,37 @@
+import re
+
+CENSORED = "~~__**CENSORED**__~~"
+
+# Every time format in one alternation, longest first, so a time is replaced
+# whole in a single left-to-right pass and nothing we insert is looked at again
+TIME_PATTERN = re.compile(r"""
+    \b\d{1,2}:\d{2}:\d{2}(?:\.\d{1,3})?\b   # hh:mm:ss and hh:mm:ss.123 (e.g., 01:30:45.123)
+  | \b\d{1,2}:\d{2}(?:\.\d{1,3})?\b         # mm:ss and mm:ss.123 (e.g., 01:30.123)
+  | \b\d{1,2}\.\d{2}\b                      # mm.ss (e.g., 01.30)
+  | \bCENSORED[:.0-9]+\b                    # Leftovers of an already censored time (e.g., CENSORED:10.000)
+""", re.VERBOSE)
+
+# Joins comments for batch censoring; it can't be part of a time and \b treats it as a boundary
+_SEPARATOR = "\x00"
+
+
+def censor_times(text):
+    """Replaces every time in the text with the CENSORED marker."""
+    if not text:
+        return text
+    return TIME_PATTERN.sub(CENSORED, text)
+
+
+def censor_many(texts):
+    """Censors a batch of texts (e.g. every run comment of a chapter) at once.
+
+    The texts are joined and run through the pattern in one call. Empty
+    texts and None are returned unchanged.
+    """
+    texts = list(texts)
+    if any(text and _SEPARATOR in text for text in texts):
+        return [censor_times(text) for text in texts]
+
+    joined = _SEPARATOR.join(text or "" for text in texts)
+    censored = TIME_PATTERN.sub(CENSORED, joined).split(_SEPARATOR)
+    return [new if text else text for text, new in zip(texts, censored)]
@@ -0,0 +1,37 @@
+import time
+
+from discord import app_commands
+
+from utils import metrics
+from utils.watchdog import track_interaction
+
+
+def command_name(interaction):
+    if interaction.command is not None:
+        return interaction.command.qualified_name
+    return (interaction.data or {}).get("name", "unknown")
+
+
+def record_command(interaction, outcome):
+    """Observe how long a command took, if the tree saw it start."""
+    started = interaction.extras.pop("started", None)
+    if started is not None:
+        metrics.command_latency.observe(command_name(interaction), outcome, value=time.perf_counter() - started)
+
+
+class InstrumentedCommandTree(app_commands.CommandTree):
+    """The bot's command tree, timing every slash command for utils.metrics.
+
+    The clock starts in the global interaction_check and stops in the
+    bot's on_app_command_completion event or in on_error. The check also
+    tells utils.watchdog which command the task is running.
+    """
+
+    async def interaction_check(self, interaction):
+        interaction.extras["started"] = time.perf_counter()
+        track_interaction(interaction, command_name(interaction))
+        return True
+
+    async def on_error(self, interaction, error):
+        record_command(interaction, "error")
+        await super().on_error(interaction, error)
@@ -0,0 +1,87 @@
+import random
+
+
+def deal_order(questions, seed, tag=None):
+    """Return the deck for one shuffle: question indices in the order they'll be dealt.
+
+    Only questions with `tag` are included when it's given. Heavier questions
+    tend to come up earlier (weighted shuffle: sort by random() ** (1 / weight)).
+    """
+    rng = random.Random(seed)
+    keyed = []
+    for index, question in enumerate(questions):
+        if tag is not None and tag not in question.tags:
+            continue
+        weight = question.weight if question.weight > 0 else 1.0
+        keyed.append((rng.random() ** (1.0 / weight), index))
+    keyed.sort(reverse=True)
+    return tuple(index for _, index in keyed)
+
+
+class DeckScheduler:
+    """Deals trivia questions per channel without repeats until the deck runs out.
+
+    A deck is stored as just (seed, position); the shuffled order is rebuilt
+    from the seed when a channel is first seen and kept in memory, so
+    dealing is O(1) and survives restarts. Decks are reshuffled when they
+    run out or when the question bank changes.
+    """
+
+    def __init__(self, db, bank):
+        self.db = db  # utils.storage.Database
+        self.bank = bank  # utils.question_bank.QuestionBank
+        self._decks = {}  # (channel_id, tag) -> [version, seed, order, position]
+
+    async def create_table(self):
+        await self.db.execute("""
+            CREATE TABLE IF NOT EXISTS trivia_decks (
+                channel_id INTEGER NOT NULL,
+                tag TEXT NOT NULL,
+                version TEXT,
+                seed INTEGER,
+                position INTEGER,
+                PRIMARY KEY (channel_id, tag)
+            )
+        """)
+
+    async def _get_deck(self, channel_id, tag):
+        key = (channel_id, tag)
+        deck = self._decks.get(key)
+        if deck is None:
+            row = await self.db.fetchone(
+                "SELECT version, seed, position FROM trivia_decks WHERE channel_id = ? AND tag = ?",
+                (channel_id, tag or ""),
+            )
+            if row is not None:
+                version, seed, position = row
+                deck = [version, seed, None, position]
+                self._decks[key] = deck
+        return deck
+
+    def _shuffle(self, key, tag):
+        seed = random.getrandbits(63)
+        deck = [self.bank.version, seed, deal_order(self.bank.questions, seed, tag), 0]
+        self._decks[key] = deck
+        return deck
+
+    async def deal(self, channel_id, tag=None):
+        """Return the next question for a channel, or None if no question has the tag."""
+        key = (channel_id, tag)
+        deck = await self._get_deck(channel_id, tag)
+        if deck is None or deck[0] != self.bank.version:
+            deck = self._shuffle(key, tag)
+        elif deck[2] is None:
+            deck[2] = deal_order(self.bank.questions, deck[1], tag)  # Rebuilt from the saved seed
+        if deck[3] >= len(deck[2]):
+            deck = self._shuffle(key, tag)
+        if not deck[2]:
+            return None
+
+        question = self.bank.questions[deck[2][deck[3]]]
+        deck[3] += 1
+        await self.db.execute("""
+            INSERT INTO trivia_decks (channel_id, tag, version, seed, position) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(channel_id, tag) DO UPDATE SET
+                version = excluded.version, seed = excluded.seed, position = excluded.position
+        """, (channel_id, tag or "", deck[0], deck[1], deck[3]))
+        return question
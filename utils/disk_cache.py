@@ -0,0 +1,71 @@
+import json
+import time
+import zlib
+from collections import namedtuple
+
+# A response read back from disk; `body` is the decompressed JSON text
+StoredResponse = namedtuple("StoredResponse", "status body etag last_modified stored_at")
+
+
+class DiskCache:
+    """Persistent speedrun.com response cache in a single SQLite file.
+
+    Bodies are stored zlib-compressed together with their ETag and
+    Last-Modified headers so they can be revalidated with a conditional
+    request after a restart.
+    """
+
+    def __init__(self, db, max_age=7 * 86400):
+        self.db = db  # utils.storage.Database
+        self.max_age = max_age
+
+    async def open(self):
+        """Create the response table and drop anything older than max_age."""
+        await self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                status INTEGER,
+                body BLOB,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL
+            )
+        """)
+        pruned = await self.db.execute(
+            "DELETE FROM responses WHERE stored_at < ?", (time.time() - self.max_age,)
+        )
+        if pruned:
+            print(f"Pruned {pruned} old responses from the HTTP cache.")
+
+    async def get(self, key):
+        """Return the StoredResponse for a key, or None."""
+        row = await self.db.fetchone(
+            "SELECT status, body, etag, last_modified, stored_at FROM responses WHERE key = ?", (key,)
+        )
+        if row is None:
+            return None
+        status, body, etag, last_modified, stored_at = row
+        return StoredResponse(status, zlib.decompress(body), etag, last_modified, stored_at)
+
+    async def put(self, key, status, body, etag=None, last_modified=None):
+        """Store a raw response body."""
+        await self.db.execute("""
+            INSERT OR REPLACE INTO responses (key, status, body, etag, last_modified, stored_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (key, status, zlib.compress(body, 6), etag, last_modified, time.time()))
+
+    async def touch(self, key):
+        """Mark a stored response as fresh again after a 304."""
+        await self.db.execute("UPDATE responses SET stored_at = ? WHERE key = ?", (time.time(), key))
+
+    async def count(self):
+        row = await self.db.fetchone("SELECT COUNT(*) FROM responses")
+        return row[0]
+
+    @staticmethod
+    def decode(stored):
+        """Parse a stored body back into JSON."""
+        try:
+            return json.loads(stored.body)
+        except ValueError:
+            return None
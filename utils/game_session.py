@@ -0,0 +1,44 @@
+import asyncio
+
+
+class ChannelSession:
+    """One round that everyone in a channel can answer.
+
+    `parse` turns a message's content into an answer, or None if the message
+    isn't one. It can be None while the round is still being set up, and
+    messages are ignored until it's set. Each user's first valid answer
+    counts and later ones are ignored. Answers are only collected here; the
+    game scores them all at once when the round closes.
+    """
+
+    def __init__(self, channel_id, parse, duration=30.0):
+        self.channel_id = channel_id
+        self.parse = parse
+        self.duration = duration
+        self.answers = {}  # user_id -> (author, answer), in the order they came in
+        self._closed = asyncio.Event()
+
+    def offer(self, message):
+        """Record a message as an answer if it is one. Returns True if it was taken."""
+        if self._closed.is_set() or self.parse is None:
+            return False  # Over, or the question hasn't been asked yet
+        if message.author.bot or message.author.id in self.answers:
+            return False
+        answer = self.parse(message.content)
+        if answer is None:
+            return False
+        self.answers[message.author.id] = (message.author, answer)
+        return True
+
+    def close(self):
+        """End the round early."""
+        self._closed.set()
+
+    async def wait(self):
+        """Wait for the answer window to end and return the answers."""
+        try:
+            await asyncio.wait_for(self._closed.wait(), self.duration)
+        except asyncio.TimeoutError:
+            pass
+        self._closed.set()
+        return list(self.answers.values())
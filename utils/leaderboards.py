@@ -0,0 +1,270 @@
+import os
+from bisect import bisect_left, insort
+
+from utils import sharding
+from utils.score_buffer import ScoreBuffer
+from utils.storage import get_database
+
+# Scores from DMs live under this guild ID
+GLOBAL_GUILD_ID = 0
+
+# The server the scores from before leaderboards were per guild belong to. Unset, they
+# stay under GLOBAL_GUILD_ID and only show up on the leaderboard in DMs
+LEGACY_GUILD_ID = int(os.getenv("LEGACY_GUILD_ID", "0")) or GLOBAL_GUILD_ID
+
+# Materialized "all games" board, fed by every game's score changes
+COMBINED_PATH = "leaderboard.db"
+
+
+class RankIndex:
+    """Per-guild scores kept sorted in memory.
+
+    Each guild has a list of (-score, user_id) keys in rank order, so the
+    top N is a slice, and a player's rank is one binary search. Score
+    changes move a single key.
+    """
+
+    def __init__(self):
+        self._scores = {}  # guild_id -> {user_id: (score, username)}
+        self._ranked = {}  # guild_id -> [(-score, user_id), ...] best first
+
+    def __contains__(self, guild_id):
+        return guild_id in self._scores
+
+    def load(self, guild_id, rows):
+        """Set a guild's scores from (user_id, username, score) rows sorted best first."""
+        self._scores[guild_id] = {user_id: (score, username) for user_id, username, score in rows}
+        self._ranked[guild_id] = [(-score, user_id) for user_id, _, score in rows]
+
+    def add(self, guild_id, user_id, username, points):
+        """Add points to a player and return their new score."""
+        scores = self._scores[guild_id]
+        ranked = self._ranked[guild_id]
+        old = scores.get(user_id)
+        if old is not None:
+            del ranked[bisect_left(ranked, (-old[0], user_id))]
+        score = (old[0] if old else 0) + points
+        scores[user_id] = (score, username)
+        insort(ranked, (-score, user_id))
+        return score
+
+    def size(self, guild_id):
+        return len(self._ranked[guild_id])
+
+    def top(self, guild_id, limit=10, offset=0):
+        """Return [(rank, user_id, username, score), ...] for one page of the board."""
+        scores = self._scores[guild_id]
+        page = []
+        for neg_score, user_id in self._ranked[guild_id][offset:offset + limit]:
+            page.append((self.rank(guild_id, user_id), user_id, scores[user_id][1], -neg_score))
+        return page
+
+    def rank(self, guild_id, user_id):
+        """Return a player's rank, or None if they have no score. Ties share a rank."""
+        entry = self._scores[guild_id].get(user_id)
+        if entry is None:
+            return None
+        return bisect_left(self._ranked[guild_id], (-entry[0],)) + 1
+
+    def score(self, guild_id, user_id):
+        entry = self._scores[guild_id].get(user_id)
+        return entry[0] if entry else None
+
+
+class GameScores:
+    """Scores for one game: the `guild_scores` table, its write buffer and a rank index.
+
+    Guilds are loaded into the rank index the first time their board is
+    read, straight off the (guild_id, score) index, and every score change
+    after that is applied to it right away, including the ones still
+    waiting in the buffer. When `shared` is set, other bot processes write
+    to the same file, so the index is dropped whenever one of them commits.
+    """
+
+    def __init__(self, db, aggregate=None, shared=False):
+        self.db = db  # utils.storage.Database
+        self.buffer = ScoreBuffer(db)
+        self.ranks = RankIndex()
+        self.aggregate = aggregate  # GameScores that also gets every point given here
+        self.shared = shared
+        self._data_version = None
+        self._opened = False
+
+    async def open(self):
+        """Create the table and index, moving over any scores from the old global table."""
+        if self._opened:
+            return
+        self._opened = True
+
+        def create(conn):
+            existed = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'guild_scores'"
+            ).fetchone()
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS guild_scores (
+                    guild_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    username TEXT,
+                    score INTEGER DEFAULT 0,
+                    PRIMARY KEY (guild_id, user_id)
+                )
+            """)
+            # Covers both the ranked reads and loading a guild in order
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS guild_scores_rank
+                ON guild_scores (guild_id, score DESC, user_id, username)
+            """)
+            legacy = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'scores'"
+            ).fetchone()
+            if not existed and legacy:
+                conn.execute("""
+                    INSERT OR IGNORE INTO guild_scores (guild_id, user_id, username, score)
+                    SELECT ?, user_id, username, score FROM scores
+                """, (LEGACY_GUILD_ID,))
+
+            # Earlier versions always moved the old scores to GLOBAL_GUILD_ID, where no
+            # server's board can see them. Hand them to LEGACY_GUILD_ID once it's set
+            conn.execute("CREATE TABLE IF NOT EXISTS legacy_moves (guild_id INTEGER PRIMARY KEY)")
+            if LEGACY_GUILD_ID != GLOBAL_GUILD_ID and not conn.execute(
+                    "SELECT 1 FROM legacy_moves WHERE guild_id = ?", (LEGACY_GUILD_ID,)).fetchone():
+                moved = conn.execute("""
+                    INSERT INTO guild_scores (guild_id, user_id, username, score)
+                    SELECT ?, user_id, username, score FROM guild_scores WHERE guild_id = ?
+                    ON CONFLICT(guild_id, user_id)
+                    DO UPDATE SET score = score + excluded.score
+                """, (LEGACY_GUILD_ID, GLOBAL_GUILD_ID)).rowcount
+                conn.execute("DELETE FROM guild_scores WHERE guild_id = ?", (GLOBAL_GUILD_ID,))
+                conn.execute("INSERT INTO legacy_moves (guild_id) VALUES (?)", (LEGACY_GUILD_ID,))
+                if moved:
+                    print(f"Moved {moved} old scores in {self.db.path} to guild {LEGACY_GUILD_ID}.")
+            elif LEGACY_GUILD_ID == GLOBAL_GUILD_ID and legacy:
+                # Can't tell the old scores apart from real DM ones later, so say it every startup
+                old_scores = conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+                if old_scores:
+                    print(f"WARNING: {self.db.path} has {old_scores} scores from before leaderboards were per "
+                          f"server, and LEGACY_GUILD_ID isn't set, so they're only on the DM leaderboard. "
+                          f"Set LEGACY_GUILD_ID to the server they belong to and restart to move them there.")
+
+        await self.db.transaction(create)
+        self.buffer.start()
+        if self.aggregate is not None:
+            await self.aggregate.open()
+            await self.aggregate.backfill_from(self)
+
+    async def backfill_from(self, source):
+        """Add a game's existing scores to this aggregate, once per game."""
+        def create(conn):
+            conn.execute("CREATE TABLE IF NOT EXISTS aggregate_sources (path TEXT PRIMARY KEY)")
+            return conn.execute("SELECT 1 FROM aggregate_sources WHERE path = ?", (source.db.path,)).fetchone()
+
+        if await self.db.transaction(create):
+            return
+        rows = await source.db.fetchall("SELECT guild_id, user_id, username, score FROM guild_scores")
+
+        def backfill(conn):
+            # Checked again in the same transaction in case two games raced here
+            if conn.execute("SELECT 1 FROM aggregate_sources WHERE path = ?", (source.db.path,)).fetchone():
+                return False
+            conn.executemany("""
+                INSERT INTO guild_scores (guild_id, user_id, username, score)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(guild_id, user_id)
+                DO UPDATE SET score = score + excluded.score
+            """, rows)
+            conn.execute("INSERT INTO aggregate_sources (path) VALUES (?)", (source.db.path,))
+            return True
+
+        async with self.buffer.lock:
+            if await self.db.transaction(backfill):
+                # Guilds already in memory would miss the new rows, so load them again on demand
+                self.ranks = RankIndex()
+                if rows:
+                    print(f"Added {len(rows)} scores from {source.db.path} to the combined leaderboard.")
+
+    async def _check_other_writers(self):
+        """Forget the rank index if another process changed the scores since we loaded it."""
+        if not self.shared:
+            return
+        version = await self.db.data_version()
+        if version != self._data_version:
+            if self._data_version is not None:
+                self.ranks = RankIndex()
+            self._data_version = version
+
+    async def _ensure_guild(self, guild_id):
+        await self._check_other_writers()
+        if guild_id in self.ranks:
+            return
+        # Hold the buffer's lock so no batch lands between reading the table and applying what's pending
+        async with self.buffer.lock:
+            if guild_id in self.ranks:
+                return
+            rows = await self.db.fetchall("""
+                SELECT user_id, username, score FROM guild_scores
+                WHERE guild_id = ? ORDER BY score DESC, user_id
+            """, (guild_id,))
+            self.ranks.load(guild_id, rows)
+            for (pending_guild, user_id), (username, points) in self.buffer.pending.items():
+                if pending_guild == guild_id:
+                    self.ranks.add(guild_id, user_id, username, points)
+
+    def add(self, guild_id, user_id, username, points):
+        """Give a player points; they're written to disk in the next batch."""
+        guild_id = guild_id or GLOBAL_GUILD_ID
+        self.buffer.add(guild_id, user_id, username, points)
+        if guild_id in self.ranks:
+            self.ranks.add(guild_id, user_id, username, points)
+        if self.aggregate is not None:
+            self.aggregate.add(guild_id, user_id, username, points)
+
+    def add_many(self, guild_id, entries):
+        """Give several players points at once, e.g. everyone who scored in a round.
+
+        `entries` is [(user_id, username, points), ...]; they all go out in the same batch.
+        """
+        for user_id, username, points in entries:
+            self.add(guild_id, user_id, username, points)
+
+    async def page(self, guild_id, page=1, per_page=10):
+        """Return (rows, total_players) for a page of a guild's board.
+
+        Rows are (rank, user_id, username, score).
+        """
+        guild_id = guild_id or GLOBAL_GUILD_ID
+        await self._ensure_guild(guild_id)
+        rows = self.ranks.top(guild_id, limit=per_page, offset=(page - 1) * per_page)
+        return rows, self.ranks.size(guild_id)
+
+    async def rank(self, guild_id, user_id):
+        """Return (rank, score) for a player in a guild, or None if they haven't scored."""
+        guild_id = guild_id or GLOBAL_GUILD_ID
+        await self._ensure_guild(guild_id)
+        rank = self.ranks.rank(guild_id, user_id)
+        if rank is None:
+            return None
+        return rank, self.ranks.score(guild_id, user_id)
+
+    async def close(self):
+        await self.buffer.stop()
+        self._opened = False
+
+
+# One GameScores per database file, shared by the game and the leaderboard
+_games = {}
+
+
+def get_game_scores(path):
+    """Return the shared GameScores for a game's database (or COMBINED_PATH for all games)."""
+    scores = _games.get(path)
+    if scores is None:
+        aggregate = get_game_scores(COMBINED_PATH) if path != COMBINED_PATH else None
+        scores = GameScores(get_database(path), aggregate, shared=sharding.is_shared())
+        _games[path] = scores
+    return scores
+
+
+async def flush_all():
+    """Write every buffered score (called when the bot shuts down)."""
+    for scores in _games.values():
+        await scores.close()
@@ -0,0 +1,255 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Latency buckets in seconds, from a fast SQLite read up to a slow speedrun.com page
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Metric:
+    """Base for one named metric with a fixed set of label names."""
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}  # label values tuple -> value
+        self._lock = threading.Lock()  # SQLite timings come in from worker threads
+
+    def _key(self, labels):
+        if len(labels) != len(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}, got {labels}")
+        return tuple(str(label) for label in labels)
+
+    def samples(self):
+        """Yield (suffix, label values, extra labels, value) for every series."""
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield "", key, (), value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.label_names, key, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, *labels, value):
+        """Mirror a running total something else keeps (e.g. the cache's hit count)."""
+        self._values[self._key(labels)] = value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, *labels, value):
+        self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    """Counts observations into cumulative `le` buckets, plus their sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, *labels, value):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]  # bucket counts, sum, count
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, *labels):
+        """Context manager that observes how long its block took."""
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        for key, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                yield "_bucket", key, (("le", _format_value(bound)),), cumulative
+            yield "_sum", key, (), total
+            yield "_count", key, (), count
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(*self.labels, value=time.perf_counter() - self.started)
+
+
+class Registry:
+    """Every metric the bot exports, plus callbacks that refresh gauges right before a scrape."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=()):
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def add_collector(self, collect):
+        """Call `collect()` before every scrape, e.g. to copy stats another object keeps into gauges."""
+        self._collectors.append(collect)
+
+    def remove_collector(self, collect):
+        if collect in self._collectors:
+            self._collectors.remove(collect)
+
+    def render(self):
+        """The whole registry in Prometheus' text exposition format."""
+        for collect in list(self._collectors):
+            try:
+                collect()
+            except Exception as e:
+                print(f"Metrics collector {collect} failed: {e}")
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+command_latency = registry.histogram(
+    "ayayabot_command_duration_seconds", "Time spent running a slash command.", ("command", "outcome"))
+speedrun_latency = registry.histogram(
+    "ayayabot_speedrun_request_duration_seconds", "speedrun.com request latency, per attempt.", ("endpoint",))
+speedrun_responses = registry.counter(
+    "ayayabot_speedrun_responses_total", "speedrun.com responses by status code.", ("endpoint", "status"))
+sqlite_latency = registry.histogram(
+    "ayayabot_sqlite_query_duration_seconds", "Time SQLite jobs take on their worker thread.", ("database", "kind"))
+cache_requests = registry.counter(
+    "ayayabot_http_cache_requests_total", "speedrun.com cache lookups since startup by result.", ("result",))
+cache_hit_ratio = registry.gauge(
+    "ayayabot_http_cache_hit_ratio", "Share of speedrun.com lookups served from memory (fresh or stale).")
+cache_bytes = registry.gauge(
+    "ayayabot_http_cache_bytes", "Size of the in-memory speedrun.com cache.")
+loop_lag = registry.histogram(
+    "ayayabot_event_loop_lag_seconds", "How late the event loop woke a sleeping task.")
+role_queue_depth = registry.gauge(
+    "ayayabot_role_queue_depth", "Members with role changes waiting to be applied.")
+role_edit_latency = registry.histogram(
+    "ayayabot_role_edit_latency_seconds", "Time from a member's first role click to their roles being updated.")
+gateway_latency = registry.gauge(
+    "ayayabot_gateway_latency_seconds", "Heartbeat latency to Discord's gateway.", ("shard",))
+
+
+def endpoint_label(path):
+    """Collapse a URL path to its endpoint, e.g. /api/v1/users/abc -> /api/v1/users."""
+    return "/".join(path.split("/")[:4]) or "/"
+
+
+async def watch_loop_lag(interval=0.5):
+    """Measure how much later than asked the loop wakes us up, forever."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        loop_lag.observe(value=max(0.0, loop.time() - started - interval))
+
+
+def watch_bot(bot):
+    """Export the bot's gateway latency and the speedrun.com cache numbers."""
+    from utils.speedrun import client as speedrun
+
+    def collect():
+        latencies = getattr(bot, "latencies", None) or [(0, bot.latency)]
+        for shard_id, latency in latencies:
+            if latency == latency and latency != math.inf:  # NaN/inf until the first heartbeat
+                gateway_latency.set(shard_id, value=latency)
+        stats = speedrun.stats()
+        for result in ("hits", "stale_hits", "misses", "disk_hits", "revalidated"):
+            cache_requests.set_total(result, value=stats[result])
+        cache_hit_ratio.set(value=stats["hit_ratio"])
+        cache_bytes.set(value=stats["bytes"])
+
+    registry.add_collector(collect)
+
+
+async def start_server(host=None, port=None):
+    """Serve /metrics on a local aiohttp server running on the bot's loop. Returns the runner, or None."""
+    from aiohttp import web
+
+    host = host or os.getenv("METRICS_HOST", "127.0.0.1")
+    port = int(port if port is not None else os.getenv("METRICS_PORT", "9108"))
+    if port == 0:
+        return None
+
+    async def handle(request):
+        return web.Response(body=registry.render().encode(),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        print(f"Couldn't serve metrics on {host}:{port}: {e}")
+        await runner.cleanup()
+        return None
+    print(f"Serving metrics on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,96 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+from collections import namedtuple
+
+# One trivia question. The lowercased options are kept for answer matching.
+# `tags` holds the optional "tags" and "difficulty" from the file, lowercased,
+# and `weight` (default 1) makes a question come up earlier in a shuffled deck.
+Question = namedtuple("Question", "text options answer options_lower answer_lower tags weight")
+
+
+def parse_questions(raw):
+    """Turn the parsed trivia_questions.json into a tuple of Questions."""
+    questions = []
+    for entry in raw["questions"]:
+        options = tuple(entry["options"])
+        tags = [tag.lower() for tag in entry.get("tags", [])]
+        if entry.get("difficulty"):
+            tags.append(entry["difficulty"].lower())
+        questions.append(Question(
+            text=entry["question"],
+            options=options,
+            answer=entry["answer"],
+            options_lower=frozenset(option.lower() for option in options),
+            answer_lower=entry["answer"].lower(),
+            tags=frozenset(tags),
+            weight=float(entry.get("weight", 1)),
+        ))
+    return tuple(questions)
+
+
+def bank_version(questions):
+    """A short hash that changes whenever the questions or their order change."""
+    digest = hashlib.sha1()
+    for question in questions:
+        digest.update(question.text.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+class QuestionBank:
+    """Trivia questions held in memory and reloaded when the file changes.
+
+    The file is read once at startup and then only when its mtime changes.
+    A reload swaps in a whole new tuple, so games that already picked a
+    question keep theirs.
+    """
+
+    def __init__(self, path="trivia_questions.json", check_interval=5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.questions = ()
+        self.version = None
+        self.mtime = None
+        self._watch_task = None
+
+    def _read(self):
+        mtime = os.stat(self.path).st_mtime
+        with open(self.path, 'r') as f:
+            return mtime, parse_questions(json.load(f))
+
+    async def load(self):
+        """(Re)load the questions from disk without blocking the event loop."""
+        mtime, questions = await asyncio.to_thread(self._read)
+        self.questions, self.version, self.mtime = questions, bank_version(questions), mtime  # Atomic swap
+        print(f"Loaded {len(questions)} trivia questions from {self.path}.")
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                mtime = (await asyncio.to_thread(os.stat, self.path)).st_mtime
+                if mtime != self.mtime:
+                    await self.load()
+            except (OSError, ValueError, KeyError) as e:
+                # Keep serving the old questions if the file is missing or half-written
+                print(f"Failed to reload trivia questions: {e}")
+
+    def start_watching(self):
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.create_task(self._watch())
+
+    def stop_watching(self):
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            self._watch_task = None
+
+    def tags(self):
+        """Every tag used by at least one question."""
+        return sorted(set().union(*(question.tags for question in self.questions)))
+
+    def random(self):
+        """Return a random question."""
+        return random.choice(self.questions)
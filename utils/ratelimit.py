@@ -0,0 +1,82 @@
+import asyncio
+import datetime
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+
+class TokenBucket:
+    """Async token bucket shared by everything that talks to one API.
+
+    Tokens refill at `rate` per `per` seconds up to `burst`. Waiters are
+    served in order, except that priority waiters (someone waiting on a
+    command's reply) go ahead of the queue. When the server tells us to
+    back off, `block_for` empties the bucket and holds every caller until
+    the deadline passes.
+    """
+
+    def __init__(self, rate, per=60.0, burst=None):
+        self.capacity = burst if burst is not None else rate
+        self.fill_rate = rate / per
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+        self._priority_waiting = 0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+        self.updated = now
+
+    async def _take(self, priority):
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            self._refill(now)
+            if self.tokens >= 1 and (priority or not self._priority_waiting):
+                self.tokens -= 1
+                return
+            await asyncio.sleep(max(1 - self.tokens, 0.1) / self.fill_rate)
+
+    async def acquire(self, priority=False):
+        """Wait until a request may be sent."""
+        if priority:
+            self._priority_waiting += 1
+            try:
+                await self._take(True)
+            finally:
+                self._priority_waiting -= 1
+            return
+        async with self._lock:
+            await self._take(False)
+
+    def block_for(self, seconds):
+        """Hold all requests for `seconds` (e.g. from a Retry-After header)."""
+        now = time.monotonic()
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self._refill(now)
+        self.tokens = 0.0
+
+
+def parse_retry_after(value):
+    """Return the number of seconds a Retry-After header asks for, or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt, base=1.0, cap=30.0):
+    """Exponential backoff with full jitter for retry number `attempt` (starting at 0)."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
@@ -0,0 +1,118 @@
+class RolePanelStore:
+    """Every role panel (a message with role buttons) in every guild.
+
+    Panels live in `message_data` and their buttons in `button_data`. All
+    buttons are also kept in one custom_id -> (guild_id, role_id) index, so
+    a click is a single dict lookup however many panels there are.
+    """
+
+    def __init__(self, db):
+        self.db = db  # utils.storage.Database
+        self._index = {}  # custom_id -> [guild_id, role_id, number of panels using it]
+        self._panels = {}  # message_id -> (guild_id, [custom_id, ...])
+
+    async def open(self):
+        """Create the tables and build the index from them."""
+        def create(conn):
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS message_data (
+                message_id TEXT PRIMARY KEY,
+                channel_id INTEGER,
+                guild_id INTEGER
+            )
+            ''')
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS button_data (
+                message_id TEXT,
+                button_name TEXT,
+                button_id TEXT,
+                role_id INTEGER,
+                FOREIGN KEY(message_id) REFERENCES message_data(message_id)
+            )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS button_data_message ON button_data (message_id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS message_data_guild ON message_data (guild_id)')
+
+        await self.db.transaction(create)
+        rows = await self.db.fetchall('''
+            SELECT m.message_id, m.guild_id, b.button_id, b.role_id
+            FROM button_data b JOIN message_data m ON m.message_id = b.message_id
+        ''')
+        self._index = {}
+        self._panels = {}
+        for message_id, guild_id, custom_id, role_id in rows:
+            self._add_button(int(message_id), guild_id, custom_id, role_id)
+        print(f"Loaded {len(self._panels)} role panels with {len(self._index)} buttons.")
+
+    def _add_button(self, message_id, guild_id, custom_id, role_id):
+        entry = self._index.get(custom_id)
+        if entry is None:
+            self._index[custom_id] = [guild_id, role_id, 1]
+        else:
+            if (entry[0], entry[1]) != (guild_id, role_id):
+                # Only old panels with fixed custom_ids can clash; the newest one wins
+                print(f"Role button {custom_id} is used for more than one role, using role {role_id} in guild {guild_id}.")
+                entry[0], entry[1] = guild_id, role_id
+            entry[2] += 1
+        self._panels.setdefault(message_id, (guild_id, []))[1].append(custom_id)
+
+    def _forget_panel(self, message_id):
+        _, custom_ids = self._panels.pop(message_id, (None, []))
+        for custom_id in custom_ids:
+            entry = self._index.get(custom_id)
+            if entry is not None:
+                entry[2] -= 1
+                if entry[2] <= 0:
+                    del self._index[custom_id]
+
+    def lookup(self, custom_id):
+        """Return (guild_id, role_id) for a button's custom_id, or None if it isn't a role button."""
+        entry = self._index.get(custom_id)
+        return (entry[0], entry[1]) if entry else None
+
+    def has_panel(self, message_id):
+        return message_id in self._panels
+
+    def panel_count(self, guild_id):
+        return sum(1 for panel_guild, _ in self._panels.values() if panel_guild == guild_id)
+
+    async def add_panel(self, message_id, channel_id, guild_id, buttons):
+        """Save a panel; `buttons` is [(label, custom_id, role_id), ...]."""
+        def save(conn):
+            conn.execute('INSERT OR REPLACE INTO message_data (message_id, channel_id, guild_id) VALUES (?, ?, ?)',
+                         (message_id, channel_id, guild_id))
+            conn.execute('DELETE FROM button_data WHERE message_id = ?', (message_id,))
+            conn.executemany('INSERT INTO button_data (message_id, button_name, button_id, role_id) VALUES (?, ?, ?, ?)',
+                             [(message_id, label, custom_id, role_id) for label, custom_id, role_id in buttons])
+
+        await self.db.transaction(save)
+        self._forget_panel(message_id)
+        for _, custom_id, role_id in buttons:
+            self._add_button(message_id, guild_id, custom_id, role_id)
+
+    async def remove_panel(self, message_id):
+        """Forget a panel whose message is gone. Returns whether it was a panel."""
+        if message_id not in self._panels:
+            return False
+        self._forget_panel(message_id)
+
+        def delete(conn):
+            conn.execute('DELETE FROM button_data WHERE message_id = ?', (message_id,))
+            conn.execute('DELETE FROM message_data WHERE message_id = ?', (message_id,))
+
+        await self.db.transaction(delete)
+        return True
+
+    async def remove_guild(self, guild_id):
+        """Forget every panel in a guild the bot left."""
+        message_ids = [message_id for message_id, (panel_guild, _) in self._panels.items() if panel_guild == guild_id]
+        for message_id in message_ids:
+            self._forget_panel(message_id)
+
+        def delete(conn):
+            conn.execute('DELETE FROM button_data WHERE message_id IN (SELECT message_id FROM message_data WHERE guild_id = ?)',
+                         (guild_id,))
+            conn.execute('DELETE FROM message_data WHERE guild_id = ?', (guild_id,))
+
+        await self.db.transaction(delete)
+        return len(message_ids)
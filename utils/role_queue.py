@@ -0,0 +1,155 @@
+import asyncio
+import time
+from collections import deque
+
+import discord
+
+from utils import metrics
+
+
+class PendingEdit:
+    """Role changes waiting to be applied to one member."""
+
+    def __init__(self, member):
+        self.member = member  # Latest copy we were given, for its current roles
+        self.changes = {}  # role_id -> (role, True to add / False to remove)
+        self.interactions = []  # Clicks to follow up on if the edit fails
+        self.queued_at = time.monotonic()
+
+
+class RoleMutationQueue:
+    """Batches role toggles per member into a single member edit.
+
+    A click only records the role the member wants to end up with. Each
+    member's changes are applied `delay` seconds after their first click,
+    in one `member.edit(roles=...)`, so a burst of clicks is one request
+    instead of one per click, and clicking a button twice just cancels out.
+    Edits for different members run side by side; edits for one member
+    never overlap.
+    """
+
+    def __init__(self, delay=1.0, history=500):
+        self.delay = delay
+        self._pending = {}  # (guild_id, member_id) -> PendingEdit
+        self._workers = {}  # (guild_id, member_id) -> task applying that member's edits
+        # Changes sent (or being sent) by a member's worker; clicks made meanwhile still
+        # carry the roles from before them, so these are laid on top
+        self._applied = {}  # (guild_id, member_id) -> {role_id: (role, add)}
+        self._latencies = deque(maxlen=history)  # Seconds from first click to the edit finishing
+        self.edits = 0
+        self.merged = 0  # Clicks that didn't need a request of their own
+        self.failures = 0
+
+    def _has_role(self, key, member, role_id):
+        applied = self._applied.get(key)
+        if applied is not None and role_id in applied:
+            return applied[role_id][1]
+        return any(member_role.id == role_id for member_role in member.roles)
+
+    def wants_role(self, member, role):
+        """Whether the member will have the role once their queued changes are applied."""
+        key = (member.guild.id, member.id)
+        pending = self._pending.get(key)
+        if pending is not None and role.id in pending.changes:
+            return pending.changes[role.id][1]
+        return self._has_role(key, member, role.id)
+
+    def toggle(self, member, role, interaction=None):
+        """Queue flipping a role for a member and return True if they'll end up with it."""
+        key = (member.guild.id, member.id)
+        add = not self.wants_role(member, role)
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = PendingEdit(member)
+            self._pending[key] = pending
+            metrics.role_queue_depth.set(value=len(self._pending))
+        else:
+            pending.member = member
+            self.merged += 1
+
+        if add == self._has_role(key, member, role.id):
+            pending.changes.pop(role.id, None)  # Back to how it was, nothing to send for this role
+        else:
+            pending.changes[role.id] = (role, add)
+        if interaction is not None:
+            pending.interactions.append(interaction)
+
+        if key not in self._workers:
+            self._workers[key] = asyncio.create_task(self._apply(key))
+        return add
+
+    async def _apply(self, key):
+        try:
+            while True:
+                await asyncio.sleep(self.delay)
+                pending = self._pending.pop(key, None)
+                metrics.role_queue_depth.set(value=len(self._pending))
+                if pending is None:
+                    return
+                if pending.changes:
+                    await self._edit(key, pending)
+                if key not in self._pending:
+                    return
+        finally:
+            self._workers.pop(key, None)
+            self._applied.pop(key, None)
+
+    async def _edit(self, key, pending):
+        member = pending.member
+        applied = self._applied.setdefault(key, {})
+        roles = {role.id: role for role in member.roles if not role.is_default()}
+        for role_id, (role, add) in list(applied.items()) + list(pending.changes.items()):
+            if add:
+                roles[role_id] = role
+            else:
+                roles.pop(role_id, None)
+        added = sum(1 for _, add in pending.changes.values() if add)
+        removed = len(pending.changes) - added
+        applied.update(pending.changes)
+        try:
+            await member.edit(roles=list(roles.values()), reason="Role panel")
+        except discord.HTTPException as e:
+            self.failures += 1
+            for role_id in pending.changes:
+                applied.pop(role_id, None)
+            print(f"Failed to update roles for {member}: {e}")
+            for interaction in pending.interactions:
+                try:
+                    await interaction.followup.send("Sorry, I couldn't update your roles. Try again in a bit.", ephemeral=True)
+                except discord.HTTPException:
+                    pass
+            return
+        latency = time.monotonic() - pending.queued_at
+        self._latencies.append(latency)
+        metrics.role_edit_latency.observe(value=latency)
+        self.edits += 1
+        print(f"Updated roles for {member} (+{added} -{removed}) after {latency:.2f}s, {self.depth()} members queued.")
+
+    def depth(self):
+        """Members with role changes waiting to be applied."""
+        return len(self._pending)
+
+    def stats(self):
+        """Queue depth, counters and latency (seconds) of recent edits."""
+        latencies = sorted(self._latencies)
+        return {
+            "depth": self.depth(),
+            "queued_changes": sum(len(pending.changes) for pending in self._pending.values()),
+            "edits": self.edits,
+            "merged": self.merged,
+            "failures": self.failures,
+            "latency_avg": sum(latencies) / len(latencies) if latencies else 0.0,
+            "latency_p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0,
+            "latency_max": latencies[-1] if latencies else 0.0,
+        }
+
+    async def close(self):
+        """Apply everything still queued (called when the cog unloads)."""
+        for task in list(self._workers.values()):
+            task.cancel()
+        self._workers.clear()
+        pending, self._pending = self._pending, {}
+        for key, edit in pending.items():
+            if edit.changes:
+                await self._edit(key, edit)
+        self._applied.clear()
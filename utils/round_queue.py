@@ -0,0 +1,91 @@
+import asyncio
+from collections import namedtuple
+
+from utils.speedrun import API_V1, SpeedrunError, client as speedrun
+
+# Everything /guess_time needs to show a round and reveal the answer
+Round = namedtuple("Round", "chapter run_id description run_date primary_t formatted_time run_url")
+
+
+def make_round(run):
+    """Prepare a round from an IndexedRun, or None if the run has no time."""
+    if run.primary_t is None:
+        return None
+    return Round(
+        chapter=run.chapter,
+        run_id=run.run_id,
+        description=run.description,
+        run_date=run.date,
+        primary_t=run.primary_t,
+        formatted_time=f"{int(run.primary_t // 60)}:{int(run.primary_t % 60):02d}",
+        run_url=f"https://www.speedrun.com/run/{run.run_id}",
+    )
+
+
+class RoundPrefetcher:
+    """Keeps a small queue of ready-to-serve rounds for every chapter.
+
+    One producer per chapter samples runs from the run index, checks that
+    each one is still verified on speedrun.com (dropping it from the index
+    if it was rejected or deleted) and queues the prepared round. With
+    `verify` off the check is skipped, for workers that leave speedrun.com
+    and the shared index to the primary one. Producers
+    block while their queue is full, so they only do work as rounds are
+    taken.
+    """
+
+    def __init__(self, run_index, chapters, depth=5, idle_delay=30.0, verify=True):
+        self.run_index = run_index
+        self.verify = verify
+        self.chapters = list(chapters)
+        self.depth = depth
+        self.idle_delay = idle_delay  # How long to wait when a chapter has no runs yet
+        self.queues = {chapter: asyncio.Queue(maxsize=depth) for chapter in self.chapters}
+        self._tasks = []
+
+    async def is_still_verified(self, run_id):
+        """Check a run upstream. Returns False only when speedrun.com says it's gone or not verified."""
+        try:
+            status, body = await speedrun.get_json(f"{API_V1}/runs/{run_id}")
+        except SpeedrunError as e:
+            print(f"Couldn't check run {run_id}: {e}")
+            return True  # Don't drop runs just because speedrun.com is having a bad time
+        if status == 404:
+            return False
+        if status != 200 or not body:
+            return True
+        return body.get("data", {}).get("status", {}).get("status") == "verified"
+
+    async def _produce(self, chapter):
+        queue = self.queues[chapter]
+        while True:
+            run = self.run_index.random_run(chapter)
+            if run is None:
+                await asyncio.sleep(self.idle_delay)
+                continue
+            if self.verify and not await self.is_still_verified(run.run_id):
+                print(f"Run {run.run_id} is no longer verified, removing it from the index.")
+                await self.run_index.remove_run(chapter, run.run_id)
+                continue
+            prepared = make_round(run)
+            if prepared is None:
+                # The pools skip runs without a time, but never spin the loop if one slips through
+                await asyncio.sleep(0)
+                continue
+            await queue.put(prepared)
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._produce(chapter)) for chapter in self.chapters]
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def pop(self, chapter):
+        """Take a prepared round for a chapter, or None if its queue is empty."""
+        try:
+            return self.queues[chapter].get_nowait()
+        except (KeyError, asyncio.QueueEmpty):
+            return None
@@ -0,0 +1,181 @@
+import random
+from array import array
+from collections import namedtuple
+
+# One indexed run. `comment` is the cleaned comment and `description` is
+# that comment with the times censored, ready to show in a round.
+IndexedRun = namedtuple("IndexedRun", "run_id chapter primary_t date comment description")
+
+
+class RunPool:
+    """The runs of one chapter that can be used for a round.
+
+    Row IDs live in a flat array so a uniform pick is one random index, and
+    the prepared runs are looked up by row ID. Removing a run swaps the last
+    ID into its slot, so that's O(1) too.
+    """
+
+    __slots__ = ("ids", "runs", "positions", "row_ids")
+
+    def __init__(self):
+        self.ids = array("q")
+        self.runs = {}  # row id -> IndexedRun
+        self.positions = {}  # row id -> index in ids
+        self.row_ids = {}  # speedrun.com run id -> row id
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, row_id, run):
+        if row_id not in self.runs:
+            self.positions[row_id] = len(self.ids)
+            self.ids.append(row_id)
+        self.runs[row_id] = run
+        self.row_ids[run.run_id] = row_id
+
+    def remove(self, run_id):
+        row_id = self.row_ids.pop(run_id, None)
+        if row_id is None:
+            return
+        position = self.positions.pop(row_id)
+        last = self.ids.pop()
+        if last != row_id:
+            self.ids[position] = last
+            self.positions[last] = position
+        del self.runs[row_id]
+
+    def sample(self):
+        if not self.ids:
+            return None
+        return self.runs[self.ids[random.randrange(len(self.ids))]]
+
+
+class RunIndex:
+    """Local SQLite copy of the verified runs used by Guess the Time.
+
+    Only runs with a comment and a time make it into the in-memory pools,
+    and their descriptions are cleaned and censored when they're added, so
+    picking a run for a round does no filtering, regex work or disk I/O.
+    """
+
+    def __init__(self, db):
+        self.db = db  # utils.storage.Database
+        self._pools = {}  # chapter -> RunPool
+        self._data_version = None
+
+    async def open(self):
+        """Create the tables and load the pools from disk."""
+        await self.create_tables()
+        await self.load_pools()
+
+    async def create_tables(self):
+        """Create the run and sync state tables if they don't already exist."""
+        def create(conn):
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    id INTEGER PRIMARY KEY,
+                    run_id TEXT UNIQUE NOT NULL,
+                    chapter TEXT NOT NULL,
+                    primary_t REAL,
+                    date TEXT,
+                    comment TEXT,
+                    verify_date TEXT,
+                    description TEXT
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    chapter TEXT PRIMARY KEY,
+                    last_verify_date TEXT
+                )
+            """)
+
+            # Older indexes don't have censored descriptions yet, so forget
+            # the sync state and let the next sync fill them in
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(runs)")]
+            if "description" not in columns:
+                conn.execute("ALTER TABLE runs ADD COLUMN description TEXT")
+                conn.execute("DELETE FROM sync_state")
+
+        await self.db.transaction(create)
+
+    async def _load_pools(self, chapter=None):
+        query = """
+            SELECT id, run_id, chapter, primary_t, date, comment, description FROM runs
+            WHERE comment IS NOT NULL AND description IS NOT NULL AND primary_t IS NOT NULL
+        """
+        params = ()
+        if chapter is not None:
+            query += " AND chapter = ?"
+            params = (chapter,)
+
+        pools = {}
+        for row_id, *run in await self.db.fetchall(query, params):
+            run = IndexedRun(*run)
+            pools.setdefault(run.chapter, RunPool()).add(row_id, run)
+        return pools
+
+    async def load_pools(self):
+        """Rebuild the in-memory pools from disk."""
+        self._data_version = await self.db.data_version()
+        self._pools = await self._load_pools()
+
+    async def reload_if_changed(self):
+        """Rebuild the pools if another process (the one that syncs) changed the runs."""
+        if await self.db.data_version() != self._data_version:
+            await self.load_pools()
+            return True
+        return False
+
+    async def last_verify_date(self, chapter):
+        """Return the newest verify-date synced for a chapter, or None if it was never synced."""
+        row = await self.db.fetchone(
+            "SELECT last_verify_date FROM sync_state WHERE chapter = ?", (chapter,)
+        )
+        return row[0] if row else None
+
+    async def add_runs(self, chapter, rows, last_verify_date):
+        """Insert or update runs for a chapter and record how far we've synced.
+
+        Each row is (run_id, primary_t, date, comment, description,
+        verify_date); comment and description are None for runs without a
+        comment.
+        """
+        def write(conn):
+            conn.executemany("""
+                INSERT INTO runs (run_id, chapter, primary_t, date, comment, description, verify_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(run_id) DO UPDATE SET
+                    primary_t = excluded.primary_t,
+                    date = excluded.date,
+                    comment = excluded.comment,
+                    description = excluded.description,
+                    verify_date = excluded.verify_date
+            """, [(run_id, chapter, primary_t, date, comment, description, verify_date)
+                  for run_id, primary_t, date, comment, description, verify_date in rows])
+            if last_verify_date:
+                conn.execute("""
+                    INSERT INTO sync_state (chapter, last_verify_date) VALUES (?, ?)
+                    ON CONFLICT(chapter) DO UPDATE SET last_verify_date = excluded.last_verify_date
+                """, (chapter, last_verify_date))
+
+        await self.db.transaction(write)
+        pools = await self._load_pools(chapter)
+        self._pools[chapter] = pools.get(chapter, RunPool())  # Swap in the new pool in one go
+
+    async def remove_run(self, chapter, run_id):
+        """Drop a run that was rejected or deleted on speedrun.com."""
+        pool = self._pools.get(chapter)
+        if pool is not None:
+            pool.remove(run_id)
+        await self.db.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+
+    def count(self, chapter):
+        """Number of runs available for rounds in a chapter."""
+        pool = self._pools.get(chapter)
+        return len(pool) if pool else 0
+
+    def random_run(self, chapter):
+        """Return a random prepared run for a chapter, or None if there are none."""
+        pool = self._pools.get(chapter)
+        return pool.sample() if pool else None
@@ -0,0 +1,73 @@
+import asyncio
+
+
+class ScoreBuffer:
+    """Write-behind buffer for a game's `guild_scores` table.
+
+    Points are added up per (guild, user) in memory and written in one
+    transaction every `flush_interval` seconds, as soon as `max_pending`
+    players are waiting, or when the buffer is stopped. `lock` is held while
+    a batch is being written.
+    """
+
+    def __init__(self, db, table="guild_scores", flush_interval=5.0, max_pending=100):
+        self.db = db  # utils.storage.Database
+        self.table = table
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending = {}  # (guild_id, user_id) -> [username, points]
+        self.lock = asyncio.Lock()
+        self._flush_task = None
+        self._loop_task = None
+
+    def add(self, guild_id, user_id, username, points):
+        """Queue points for a player."""
+        entry = self.pending.get((guild_id, user_id))
+        if entry is None:
+            self.pending[(guild_id, user_id)] = [username, points]
+        else:
+            entry[0] = username
+            entry[1] += points
+        if len(self.pending) >= self.max_pending:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        """Write every pending increment in one transaction."""
+        async with self.lock:
+            if not self.pending:
+                return
+            batch, self.pending = self.pending, {}
+            rows = [(guild_id, user_id, username, points, points)
+                    for (guild_id, user_id), (username, points) in batch.items()]
+            try:
+                await self.db.executemany(f"""
+                    INSERT INTO {self.table} (guild_id, user_id, username, score)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(guild_id, user_id)
+                    DO UPDATE SET score = score + ?, username = excluded.username;
+                """, rows)
+            except Exception as e:
+                # Put the points back so the next flush tries again
+                print(f"Failed to flush {len(rows)} scores to {self.db.path}: {e}")
+                for (guild_id, user_id), (username, points) in batch.items():
+                    self.add(guild_id, user_id, username, points)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the flush loop and write whatever is still pending."""
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            self._loop_task = None
+        await self.flush()
@@ -0,0 +1,56 @@
+import os
+
+# Set by launcher.py for each worker process; a plain `python ayayabot.py` is worker 0 of 1
+WORKER_ID = int(os.getenv("WORKER_ID", "0"))
+WORKER_COUNT = int(os.getenv("WORKER_COUNT", "1"))
+
+
+def parse_shard_ids(value):
+    """Parse "0,1,2" into [0, 1, 2]; empty means every shard."""
+    if not value:
+        return None
+    return [int(shard_id) for shard_id in value.split(",") if shard_id.strip()]
+
+
+# SHARD_COUNT picks a fixed count, AUTO_SHARD=1 lets Discord recommend one
+SHARD_COUNT = int(os.getenv("SHARD_COUNT")) if os.getenv("SHARD_COUNT") else None
+SHARD_IDS = parse_shard_ids(os.getenv("SHARD_IDS"))
+SHARDED = SHARD_COUNT is not None or os.getenv("AUTO_SHARD") == "1"
+
+
+def is_primary():
+    """Whether this process does the once-per-deployment work (syncing commands, runs, ...)."""
+    return WORKER_ID == 0
+
+
+def is_shared():
+    """Whether other processes write to the same databases as this one."""
+    return WORKER_COUNT > 1
+
+
+def shard_for_guild(guild_id, shard_count):
+    """The shard Discord sends a guild's events to."""
+    return (guild_id >> 22) % shard_count
+
+
+def split_shards(shard_count, workers):
+    """Split shard IDs into `workers` contiguous, nearly equal groups."""
+    workers = max(1, min(workers, shard_count))
+    size, extra = divmod(shard_count, workers)
+    groups = []
+    start = 0
+    for worker in range(workers):
+        end = start + size + (1 if worker < extra else 0)
+        groups.append(list(range(start, end)))
+        start = end
+    return groups
+
+
+def bot_options():
+    """Keyword arguments for AutoShardedBot from the environment."""
+    options = {}
+    if SHARD_COUNT is not None:
+        options["shard_count"] = SHARD_COUNT
+        if SHARD_IDS is not None:
+            options["shard_ids"] = SHARD_IDS
+    return options
@@ -0,0 +1,332 @@
+import asyncio
+import json
+import os
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from utils import metrics
+from utils.cache import ResponseCache
+from utils.disk_cache import DiskCache
+from utils.ratelimit import TokenBucket, backoff_delay, parse_retry_after
+from utils.storage import get_database
+
+API_V1 = "https://www.speedrun.com/api/v1"
+API_V2 = "https://www.speedrun.com/api/v2"
+
+# Status codes speedrun.com uses to say "slow down" (420 is its old throttling code)
+THROTTLED = {420, 429}
+RETRYABLE = THROTTLED | {502, 503, 504}
+
+# (path prefix, ttl seconds, stale-while-revalidate seconds) per endpoint
+CACHE_TTLS = [
+    ("/api/v1/users/", 3600, 86400),           # Profiles barely change
+    ("/api/v2/GetUserPopoverData", 0, 0),     # Used to verify /link, so never reuse an old answer
+    ("/api/v1/runs", 300, 0),                  # Run pages are only reused when they're fresh
+]
+
+
+class SpeedrunError(Exception):
+    """Raised when a speedrun.com request fails before a response comes back."""
+
+
+class PageStats:
+    """Timing numbers for one paginated fetch."""
+
+    def __init__(self, pages, items, elapsed):
+        self.pages = pages
+        self.items = items
+        self.elapsed = elapsed
+
+    @property
+    def pages_per_sec(self):
+        return self.pages / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self):
+        return f"{self.items} items in {self.pages} pages, {self.elapsed:.2f}s ({self.pages_per_sec:.1f} pages/s)"
+
+
+class SpeedrunClient:
+    """Shared async HTTP client for speedrun.com.
+
+    Every cog goes through the same keep-alive session, so connections are
+    pooled and a slow response only ever holds up the coroutine waiting for it.
+    """
+
+    def __init__(self, max_connections=20, limit_per_host=4, timeout=10.0, connect_timeout=5.0,
+                 host_limits=None, host_timeouts=None, cache=None, rate_per_minute=100, max_retries=3,
+                 disk_cache_path="http_cache.db"):
+        self.max_connections = max_connections
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        # Per-host overrides, e.g. {"www.speedrun.com": 6}
+        self.host_limits = dict(host_limits or {})
+        self.host_timeouts = dict(host_timeouts or {})
+        self._session = None
+        self._host_semaphores = {}
+        self.cache = cache if cache is not None else ResponseCache(CACHE_TTLS)
+        self._refreshing = {}  # cache key -> background refresh task
+        # speedrun.com allows about 100 requests a minute per client
+        self.rate_limiter = TokenBucket(rate_per_minute, per=60.0, burst=10)
+        self.max_retries = max_retries
+        self._in_flight = {}  # cache key -> task for a request that's already being made
+        # Responses survive restarts here; None turns the disk cache off
+        self.disk_cache_path = disk_cache_path
+        self._disk_cache = None
+        self._disk_cache_lock = asyncio.Lock()
+        self.disk_hits = 0
+        self.revalidated = 0
+
+    def _get_session(self):
+        """Create the pooled session on first use (it has to live on the running loop)."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                ttl_dns_cache=300,
+                keepalive_timeout=30,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={"User-Agent": "AyayaBot (discord bot)"},
+            )
+        return self._session
+
+    def _host_semaphore(self, host):
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.host_limits.get(host, self.limit_per_host))
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    def _timeout_for(self, host, timeout=None):
+        total = timeout if timeout is not None else self.host_timeouts.get(host, self.timeout)
+        return aiohttp.ClientTimeout(total=total, connect=min(self.connect_timeout, total))
+
+    async def _fetch(self, url, params=None, timeout=None, headers=None, priority=False):
+        """Do the actual GET and return (status_code, parsed_json, body, (etag, last_modified)).
+
+        Every attempt waits for the shared rate limiter. Throttled and
+        temporarily unavailable responses are retried after the Retry-After
+        the server sent, or a jittered backoff when it didn't send one.
+        """
+        parts = urlsplit(url)
+        host = parts.hostname
+        endpoint = metrics.endpoint_label(parts.path)
+        session = self._get_session()
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire(priority)
+            try:
+                async with self._host_semaphore(host):
+                    started = time.perf_counter()
+                    async with session.get(url, params=params, headers=headers,
+                                           timeout=self._timeout_for(host, timeout)) as response:
+                        status = response.status
+                        metrics.speedrun_latency.observe(endpoint, value=time.perf_counter() - started)
+                        metrics.speedrun_responses.inc(endpoint, status)
+                        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                        if status not in RETRYABLE or attempt >= self.max_retries:
+                            body = await response.read()
+                            try:
+                                data = json.loads(body)
+                            except ValueError:
+                                data = None
+                            validators = (response.headers.get("ETag"), response.headers.get("Last-Modified"))
+                            return status, data, body, validators
+            except asyncio.TimeoutError as e:
+                metrics.speedrun_responses.inc(endpoint, "timeout")
+                raise SpeedrunError(f"Timed out requesting {url}") from e
+            except aiohttp.ClientError as e:
+                metrics.speedrun_responses.inc(endpoint, "error")
+                raise SpeedrunError(f"Error requesting {url}: {e}") from e
+
+            delay = retry_after if retry_after is not None else backoff_delay(attempt)
+            if status in THROTTLED:
+                # Everyone waits, not just this request
+                self.rate_limiter.block_for(delay)
+            print(f"speedrun.com returned {status} for {url}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _get_disk_cache(self):
+        if self._disk_cache is None and self.disk_cache_path:
+            async with self._disk_cache_lock:
+                if self._disk_cache is None:
+                    disk_cache = DiskCache(get_database(self.disk_cache_path))
+                    await disk_cache.open()
+                    print(f"Opened HTTP cache with {await disk_cache.count()} stored responses.")
+                    self._disk_cache = disk_cache
+        return self._disk_cache
+
+    async def _load(self, key, url, params=None, timeout=None, store=True, priority=False):
+        """Fetch a URL and, if `store` is set, keep a 200 in both caches.
+
+        A response we already have on disk is revalidated with a conditional
+        request, and a 304 reuses the stored body.
+        """
+        disk_cache = await self._get_disk_cache() if store else None
+        stored = await disk_cache.get(key) if disk_cache else None
+        headers = {}
+        if stored is not None:
+            if stored.etag:
+                headers["If-None-Match"] = stored.etag
+            if stored.last_modified:
+                headers["If-Modified-Since"] = stored.last_modified
+
+        status, data, body, (etag, last_modified) = await self._fetch(url, params, timeout, headers or None, priority)
+        if status == 304 and stored is not None:
+            self.revalidated += 1
+            await disk_cache.touch(key)
+            status, data, body = stored.status, DiskCache.decode(stored), stored.body
+        elif status == 200 and disk_cache:
+            await disk_cache.put(key, status, body, etag, last_modified)
+
+        if status == 200 and store:
+            self.cache.put(key, url, status, data, len(body))
+        return status, data
+
+    async def _load_shared(self, key, url, params=None, timeout=None, store=True, priority=False):
+        """Like _load, but identical requests already in flight share one response."""
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load(key, url, params, timeout, store, priority))
+            self._in_flight[key] = task
+
+            def done(finished, key=key):
+                if self._in_flight.get(key) is finished:
+                    del self._in_flight[key]
+                if not finished.cancelled():
+                    finished.exception()  # Mark it retrieved even if every waiter gave up
+
+            task.add_done_callback(done)
+        # Shielded so one caller giving up doesn't cancel the others' request
+        return await asyncio.shield(task)
+
+    async def get_json(self, url, params=None, timeout=None, cache=True, priority=False):
+        """GET a URL and return (status_code, parsed_json).
+
+        The JSON is None when the body can't be parsed. Network errors and
+        timeouts are raised as SpeedrunError. Successful responses are cached
+        in memory and on disk; a stale entry is returned straight away while
+        it's refreshed in the background. Pass cache=False to always go to
+        speedrun.com. Pass priority=True for requests a user is waiting on, so
+        they skip ahead of background syncs in the rate limiter.
+        """
+        key = self.cache.make_key(url, params)
+        if not cache:
+            return await self._load_shared(key, url, params, timeout, store=False, priority=priority)
+
+        entry, is_stale = self.cache.get(key)
+        if entry is not None:
+            if is_stale:
+                self._schedule_refresh(key, url, params, timeout)
+            return entry.status, entry.data
+
+        # Not in memory, so try what an earlier run of the bot saved
+        disk_cache = await self._get_disk_cache()
+        stored = await disk_cache.get(key) if disk_cache else None
+        if stored is not None:
+            ttl, stale_ttl = self.cache.ttls_for(url)
+            age = time.time() - stored.stored_at
+            if age <= ttl + stale_ttl:
+                self.disk_hits += 1
+                data = DiskCache.decode(stored)
+                self.cache.put(key, url, stored.status, data, len(stored.body), age=age)
+                if age > ttl:
+                    self._schedule_refresh(key, url, params, timeout)
+                return stored.status, data
+
+        return await self._load_shared(key, url, params, timeout, priority=priority)
+
+    def _schedule_refresh(self, key, url, params, timeout):
+        if key not in self._refreshing:
+            self._refreshing[key] = asyncio.create_task(self._refresh(key, url, params, timeout))
+
+    async def _refresh(self, key, url, params, timeout):
+        """Re-fetch a stale cache entry in the background."""
+        try:
+            status, _ = await self._load_shared(key, url, params, timeout)
+            if status == 200:
+                self.cache.refreshes += 1
+        except SpeedrunError as e:
+            print(f"Failed to refresh cached {key}: {e}")
+        finally:
+            self._refreshing.pop(key, None)
+
+    async def get_paginated(self, url, params=None, page_size=200, fan_out=4):
+        """Fetch every page of a v1 list endpoint and return (items, PageStats).
+
+        The API doesn't report a total, so after the first page we probe ahead
+        `fan_out` pages at a time and stop at the first short page. Pages are
+        put back in offset order before being joined. If a page fails, the
+        items before it are still returned.
+        """
+        params = dict(params or {})
+        started = time.perf_counter()
+        pages = {}
+
+        async def fetch_page(offset):
+            status, body = await self.get_json(url, params={**params, "max": page_size, "offset": offset})
+            if status != 200:
+                print(f"Failed to fetch {url} at offset {offset}. Status code: {status}")
+                return None
+            return (body or {}).get("data", [])
+
+        # The first page tells us whether there's anything more to probe for
+        first = await fetch_page(0)
+        pages[0] = first
+        next_page = 1
+        done = first is None or len(first) < page_size
+        while not done:
+            window = range(next_page, next_page + fan_out)
+            results = await asyncio.gather(
+                *(fetch_page(index * page_size) for index in window),
+                return_exceptions=True,
+            )
+            for index, result in zip(window, results):
+                if isinstance(result, BaseException):
+                    print(f"Error fetching {url} at offset {index * page_size}: {result}")
+                    result = None
+                pages[index] = result
+                if result is None or len(result) < page_size:
+                    done = True
+            next_page += fan_out
+
+        # Join in order, stopping at the first failed or short page
+        items = []
+        fetched = 0
+        for index in sorted(pages):
+            page = pages[index]
+            if page is None:
+                break
+            items.extend(page)
+            fetched += 1
+            if len(page) < page_size:
+                break
+
+        return items, PageStats(fetched, len(items), time.perf_counter() - started)
+
+    def stats(self):
+        """Cache counters for the memory and disk caches."""
+        return {**self.cache.stats(), "disk_hits": self.disk_hits, "revalidated": self.revalidated}
+
+    async def close(self):
+        """Close the pooled session (called when the bot shuts down)."""
+        for task in list(self._refreshing.values()):
+            task.cancel()
+        self._refreshing.clear()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._disk_cache = None  # Its database is closed with the others by utils.storage.close_all
+
+
+# The one client shared by every cog
+client = SpeedrunClient(
+    max_connections=int(os.getenv("SPEEDRUN_MAX_CONNECTIONS", "20")),
+    limit_per_host=int(os.getenv("SPEEDRUN_LIMIT_PER_HOST", "4")),
+    timeout=float(os.getenv("SPEEDRUN_TIMEOUT", "10")),
+    rate_per_minute=int(os.getenv("SPEEDRUN_RATE_PER_MINUTE", "100")),
+)
@@ -0,0 +1,177 @@
+import asyncio
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import metrics
+
+
+class Database:
+    """Async access to one SQLite file.
+
+    The file is opened in WAL mode so reads never wait for writes. Reads go
+    through a small pool of connections on worker threads, and every write
+    is queued to a single writer task with its own connection and thread, so
+    writes are serialized and fsyncs never run on the event loop.
+    """
+
+    def __init__(self, path, readers=2):
+        self.path = path
+        self.readers = readers
+        self._open_lock = asyncio.Lock()
+        self._opened = False
+        self._writer = None
+        self._writer_executor = None
+        self._writer_task = None
+        self._write_queue = None
+        self._reader_executor = None
+        self._reader_pool = None
+        self._label = os.path.basename(path)  # For metrics
+
+    def _connect(self):
+        # Autocommit mode: _run_write opens its own transactions, so nothing runs outside one
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")  # Safe with WAL, one fsync per checkpoint instead of per commit
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    async def _ensure_open(self):
+        if self._opened:
+            return
+        async with self._open_lock:
+            if self._opened:
+                return
+            loop = asyncio.get_running_loop()
+            self._writer_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"sqlite-writer-{self.path}")
+            self._reader_executor = ThreadPoolExecutor(max_workers=self.readers, thread_name_prefix=f"sqlite-reader-{self.path}")
+            # The writer connection also creates the file and switches it to WAL
+            self._writer = await loop.run_in_executor(self._writer_executor, self._connect)
+            self._reader_pool = asyncio.Queue()
+            for _ in range(self.readers):
+                self._reader_pool.put_nowait(await loop.run_in_executor(self._reader_executor, self._connect))
+            self._write_queue = asyncio.Queue()
+            self._writer_task = asyncio.create_task(self._write_loop())
+            self._opened = True
+
+    async def _write_loop(self):
+        """Runs queued writes one at a time on the writer thread."""
+        loop = asyncio.get_running_loop()
+        while True:
+            job, future = await self._write_queue.get()
+            try:
+                if job is None:  # close() asked us to stop
+                    future.set_result(None)
+                    return
+                if future.cancelled():
+                    continue
+                try:
+                    result = await loop.run_in_executor(self._writer_executor, self._run_write, job)
+                except Exception as e:
+                    if not future.cancelled():
+                        future.set_exception(e)
+                else:
+                    if not future.cancelled():
+                        future.set_result(result)
+            finally:
+                self._write_queue.task_done()
+
+    def _run_write(self, job):
+        # One transaction per job: commit on success, roll back on error. BEGIN IMMEDIATE
+        # takes the write lock up front, so a job's checks and writes are atomic even
+        # against other processes sharing the file
+        with metrics.sqlite_latency.time(self._label, "write"):
+            self._writer.execute("BEGIN IMMEDIATE")
+            try:
+                result = job(self._writer)
+            except BaseException:
+                self._writer.execute("ROLLBACK")
+                raise
+            self._writer.execute("COMMIT")
+            return result
+
+    def _run_read(self, job, conn):
+        with metrics.sqlite_latency.time(self._label, "read"):
+            return job(conn)
+
+    async def transaction(self, job):
+        """Run `job(connection)` inside a write transaction and return its result.
+
+        The job runs on the writer thread, so it must be plain blocking code.
+        """
+        await self._ensure_open()
+        future = asyncio.get_running_loop().create_future()
+        await self._write_queue.put((job, future))
+        return await future
+
+    async def execute(self, sql, params=()):
+        """Run one write statement and return the number of rows it changed."""
+        return await self.transaction(lambda conn: conn.execute(sql, params).rowcount)
+
+    async def executemany(self, sql, seq_of_params):
+        """Run one write statement for every set of params in a single transaction."""
+        seq_of_params = list(seq_of_params)
+        return await self.transaction(lambda conn: conn.executemany(sql, seq_of_params).rowcount)
+
+    async def data_version(self):
+        """Return SQLite's data_version as seen by the writer connection.
+
+        It only changes when another connection commits, i.e. another bot
+        process sharing this file, so it tells us when in-memory copies of
+        the data are out of date.
+        """
+        await self._ensure_open()
+        future = asyncio.get_running_loop().create_future()
+        await self._write_queue.put((lambda conn: conn.execute("PRAGMA data_version").fetchone()[0], future))
+        return await future
+
+    async def read(self, job):
+        """Run `job(connection)` on a reader connection and return its result."""
+        await self._ensure_open()
+        conn = await self._reader_pool.get()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._reader_executor, self._run_read, job, conn)
+        finally:
+            self._reader_pool.put_nowait(conn)
+
+    async def fetchone(self, sql, params=()):
+        return await self.read(lambda conn: conn.execute(sql, params).fetchone())
+
+    async def fetchall(self, sql, params=()):
+        return await self.read(lambda conn: conn.execute(sql, params).fetchall())
+
+    async def close(self):
+        """Finish queued writes and close every connection."""
+        if not self._opened:
+            return
+        self._opened = False
+        loop = asyncio.get_running_loop()
+        stop = loop.create_future()
+        await self._write_queue.put((None, stop))
+        await stop
+        await loop.run_in_executor(self._writer_executor, self._writer.close)
+        while not self._reader_pool.empty():
+            conn = self._reader_pool.get_nowait()
+            await loop.run_in_executor(self._reader_executor, conn.close)
+        self._writer_executor.shutdown(wait=False)
+        self._reader_executor.shutdown(wait=False)
+
+
+# One Database per file, shared by every cog that uses it
+_databases = {}
+
+
+def get_database(path):
+    """Return the shared Database for a file, creating it on first use."""
+    database = _databases.get(path)
+    if database is None:
+        database = Database(path)
+        _databases[path] = database
+    return database
+
+
+async def close_all():
+    """Close every shared database (called when the bot shuts down)."""
+    for database in list(_databases.values()):
+        await database.close()
+    _databases.clear()
@@ -0,0 +1,78 @@
+import asyncio
+import random
+import time
+
+from utils import sharding
+from utils.leaderboards import COMBINED_PATH, get_game_scores
+
+# Points per round, like a trivia win
+POINTS = 50
+
+
+def stub_guild_ids(count):
+    """Fake guild snowflakes, spread over the shards the same way real ones are."""
+    return [index << 22 for index in range(1, count + 1)]
+
+
+class StubGateway:
+    """Stands in for Discord's gateway so the launcher can be tried locally.
+
+    Instead of connecting, each worker plays `rounds` rounds in every stub
+    guild that Discord would route to one of its shards, scoring through
+    the shared leaderboards like the real games do. It then waits until
+    the combined board shows every worker's points, which only happens if
+    the processes really see each other's writes.
+    """
+
+    def __init__(self, shard_ids, shard_count, guilds=32, players=8, rounds=5, timeout=30.0):
+        self.shard_ids = set(shard_ids)
+        self.shard_count = shard_count
+        self.guild_ids = stub_guild_ids(guilds)
+        self.players = players
+        self.rounds = rounds
+        self.timeout = timeout
+
+    def owned_guilds(self):
+        return [guild_id for guild_id in self.guild_ids
+                if sharding.shard_for_guild(guild_id, self.shard_count) in self.shard_ids]
+
+    async def play(self):
+        """Score every round in this worker's guilds and write them out."""
+        scores = get_game_scores("trivia.db")
+        await scores.open()
+        rng = random.Random(sharding.WORKER_ID)
+        owned = self.owned_guilds()
+        for _ in range(self.rounds):
+            for guild_id in owned:
+                user_id = rng.randrange(self.players) + 1
+                scores.add(guild_id, user_id, f"player{user_id}", POINTS)
+                await asyncio.sleep(0)  # Let the buffers flush like they would between events
+        await scores.buffer.flush()
+        await scores.aggregate.buffer.flush()
+        return len(owned)
+
+    async def wait_for_everyone(self):
+        """Return True once the combined board has every worker's points."""
+        combined = get_game_scores(COMBINED_PATH)
+        expected = len(self.guild_ids) * self.rounds * POINTS
+        deadline = time.monotonic() + self.timeout
+        while True:
+            total = 0
+            for guild_id in self.guild_ids:
+                rows, _ = await combined.page(guild_id, per_page=self.players)
+                total += sum(score for _, _, _, score in rows)
+            if total == expected:
+                return True
+            if time.monotonic() > deadline:
+                print(f"[worker {sharding.WORKER_ID}] Combined board has {total} points, expected {expected}.")
+                return False
+            await asyncio.sleep(0.2)
+
+    async def run(self):
+        started = time.perf_counter()
+        owned = await self.play()
+        consistent = await self.wait_for_everyone()
+        print(f"[worker {sharding.WORKER_ID}] Shards {sorted(self.shard_ids)}: played {owned} of "
+              f"{len(self.guild_ids)} guilds, combined board {'consistent' if consistent else 'INCONSISTENT'} "
+              f"after {time.perf_counter() - started:.2f}s")
+        return consistent
@@ -0,0 +1,118 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+
+from utils import metrics
+
+# How many frames of the blocking code to log
+STACK_LIMIT = 25
+
+stalls = metrics.registry.counter(
+    "ayayabot_event_loop_stalls_total", "Times the event loop was blocked longer than the watchdog threshold.", ("command",))
+
+# Task running a command -> (command name, guild ID), filled in by the command tree
+_active = {}
+
+
+def track_interaction(interaction, name):
+    """Remember which command (and guild) the current task is running, for stall reports."""
+    task = asyncio.current_task()
+    if task is None:
+        return
+    _active[task] = (f"/{name}", interaction.guild_id)
+    task.add_done_callback(lambda finished: _active.pop(finished, None))
+
+
+def _describe_frames(frame):
+    """Find the command a blocked stack belongs to by looking for an `interaction` argument."""
+    while frame is not None:
+        interaction = frame.f_locals.get("interaction")
+        if interaction is not None and hasattr(interaction, "guild_id"):
+            command = getattr(interaction, "command", None)
+            if command is not None:
+                return f"/{command.qualified_name}", interaction.guild_id
+            custom_id = (getattr(interaction, "data", None) or {}).get("custom_id")
+            return f"button {custom_id}" if custom_id else frame.f_code.co_name, interaction.guild_id
+        frame = frame.f_back
+    return None
+
+
+class LoopWatchdog:
+    """Notices when the event loop stops responding and logs what's blocking it.
+
+    A coroutine on the loop bumps a heartbeat every `interval` seconds and a
+    background thread checks it. If the heartbeat is more than `threshold`
+    seconds old, the thread grabs the loop thread's current stack, works
+    out which command and guild it's running for, and prints both. Each
+    stall is reported once, with its total length logged when it ends.
+    """
+
+    def __init__(self, threshold=0.5, interval=0.1):
+        self.threshold = threshold
+        self.interval = interval
+        self._loop = None
+        self._loop_thread_id = None
+        self._last_beat = time.monotonic()
+        self._heartbeat = None
+        self._thread = None
+        self._stopped = threading.Event()
+        self.stall_count = 0
+
+    async def _beat(self):
+        while True:
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start watching the running loop (call from a coroutine on it)."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._heartbeat = asyncio.create_task(self._beat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+
+    def _blocked_command(self, frame):
+        # The task the loop is stuck in, if the command tree registered it
+        task = asyncio.current_task(self._loop)
+        if task is not None and task in _active:
+            return _active[task]
+        return _describe_frames(frame)
+
+    def _watch(self):
+        reported_beat = None
+        stalled_since = None
+        while not self._stopped.wait(self.interval):
+            beat = self._last_beat
+            lag = time.monotonic() - beat
+            if lag <= self.threshold:
+                if stalled_since is not None:
+                    print(f"Event loop recovered after a {beat - stalled_since:.2f}s stall.")
+                    stalled_since = None
+                continue
+            if reported_beat == beat:
+                continue  # Already reported this stall
+            reported_beat = beat
+            stalled_since = beat
+            self._report(lag)
+
+    def _report(self, lag):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        blocked = self._blocked_command(frame)
+        command, guild_id = blocked if blocked else (None, None)
+        stack = "".join(traceback.format_stack(frame, limit=STACK_LIMIT))
+        self.stall_count += 1
+        stalls.inc(command or "none")
+        where = f" in {command} (guild {guild_id})" if command else ""
+        print(f"Event loop blocked for {lag:.2f}s{where}. Blocking code:\n{stack}", end="")